@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for the hot paths of pycryptotools.
+
+Usage: python bench.py [name ...]  (runs every benchmark by default)
+
+Set PYCRYPTOTOOLS_EC_BACKEND=python to time the pure Python code when
+coincurve is installed.
+"""
+import binascii
+import os
+import random
+import sys
+import timeit
+
+from pycryptotools import *
+from pycryptotools import main
+
+import bench_legacy_ripemd
+
+
+def _recursive_jacobian_multiply(a, n):
+    # double-and-add multiplier used before the wNAF rewrite, kept as reference
+    if a[1] == 0 or n == 0:
+        return (0, 0, 1)
+    if n == 1:
+        return a
+    if n < 0 or n >= N:
+        return _recursive_jacobian_multiply(a, n % N)
+    if (n % 2) == 0:
+        return main.jacobian_double(_recursive_jacobian_multiply(a, n//2))
+    if (n % 2) == 1:
+        return main.jacobian_add(main.jacobian_double(_recursive_jacobian_multiply(a, n//2)), a)
+
+
+def _legacy_encode(val, base, minlen=0):
+    # py3specials.encode before the linear-time rewrite, kept as reference
+    code_string = get_code_string(base)
+    result_bytes = bytes()
+    while val > 0:
+        result_bytes = bytes([ord(code_string[val % base])]) + result_bytes
+        val //= base
+    padding_element = b'\x00' if base == 256 else b'1' if base == 58 else b'0'
+    if minlen > len(result_bytes):
+        result_bytes = padding_element * (minlen - len(result_bytes)) + result_bytes
+    return result_bytes if base == 256 else ''.join([chr(y) for y in result_bytes])
+
+
+def _legacy_decode(string, base):
+    # py3specials.decode before the linear-time rewrite, kept as reference
+    if base == 256 and isinstance(string, str):
+        string = bytes(bytearray.fromhex(string))
+    code_string = get_code_string(base)
+    if base == 16:
+        string = string.lower()
+    result = 0
+    while len(string) > 0:
+        d = string[0]
+        result = result * base + (d if base == 256 else code_string.find(d if isinstance(d, str) else chr(d)))
+        string = string[1:]
+    return result
+
+
+def _legacy_ripemd160(data):
+    # ripemd.RIPEMD160 before the rewrite, vendored verbatim in bench_legacy_ripemd
+    return bench_legacy_ripemd.RIPEMD160(data).digest()
+
+
+def report(label, fn, args, ops=None):
+    fn(*args[0])
+    t = timeit.timeit(lambda: [fn(*a) for a in args], number=1)
+    print('%-40s %10.1f us/op' % (label, t / (ops or len(args)) * 1e6))
+
+
+def bench_multiply(count=200):
+    points = [to_jacobian(fast_base_multiply(random.randrange(1, N))) for i in range(count)]
+    args = [(p, random.randrange(1, N)) for p in points]
+    report('jacobian_multiply (recursive)', _recursive_jacobian_multiply, args)
+    report('jacobian_multiply', jacobian_multiply, args)
+    report('multiply (hex pubkey)', multiply,
+           [(encode_pubkey(from_jacobian(p), 'hex'), k) for p, k in args])
+    handle = precompute(from_jacobian(points[0]))
+    report('precompute(...).multiply', handle.multiply, [(k,) for p, k in args])
+
+
+def bench_privtopub(count=500):
+    privs = [encode(random.randrange(1, N), 16, 64) for i in range(count)]
+    report('privtopub', privtopub, [(priv,) for priv in privs])
+    report('privkeys_to_pubkeys', lambda privs: list(privkeys_to_pubkeys(privs)), [(privs,)], count)
+
+
+def _signatures(count):
+    items = []
+    for i in range(count):
+        priv, msghash = random.randrange(1, N), encode(random.randrange(2**256), 16, 64)
+        items.append((msghash, ecdsa_raw_sign(msghash, priv), privtopub(priv)))
+    return items
+
+
+def bench_sign(count=100):
+    priv = random.randrange(1, N)
+    hashes = [encode(random.randrange(2**256), 16, 64) for i in range(count)]
+    report('ecdsa_raw_sign', ecdsa_raw_sign, [(h, priv) for h in hashes])
+    for verify in SigningKey.VERIFY_POLICIES:
+        key = SigningKey(priv, verify=verify)
+        report('SigningKey.sign_many (verify=%s)' % verify, key.sign_many, [(hashes,)], count)
+
+
+def bench_verify(count=100):
+    items = _signatures(count)
+    report('ecdsa_raw_verify', ecdsa_raw_verify, items)
+    report('ecdsa_raw_recover', ecdsa_raw_recover, [(h, vrs) for h, vrs, pub in items])
+    report('ecdsa_batch_verify', ecdsa_batch_verify, [(items,)], count)
+    report('ecdsa_batch_verify (all_valid)', ecdsa_batch_verify, [(items, True)], count)
+
+
+def bench_messages(count=100):
+    items = []
+    for i in range(count):
+        priv, msg = random.randrange(1, N), 'message %d' % (i % 10)
+        v, r, s = ecdsa_raw_sign(electrum_sig_hash(msg), priv)
+        items.append((msg, encode_sig(v + 4, r, s), pubtolegacy(compress(privtopub(priv)))))
+
+    def verify_addr(msg, sig, addr):
+        # what ecdsa_verify_addr does for a legacy address
+        Q = ecdsa_recover(msg, sig)
+        return addr == pubtolegacy(Q) or addr == pubtolegacy(compress(Q))
+    report('recover and derive both addresses', verify_addr, items)
+    report('ecdsa_verify_addr_many', ecdsa_verify_addr_many, [(items,)], count)
+
+
+def bench_codecs(count=2000):
+    values = [random.randrange(2**256) for i in range(count)]
+    for base, minlen in ((256, 32), (16, 64), (58, 0)):
+        encoded = [encode(v, base, minlen) for v in values]
+        for label, enc, dec in (('legacy', _legacy_encode, _legacy_decode), ('', encode, decode)):
+            report(('%s encode base %d' % (label, base)).strip(), enc, [(v, base, minlen) for v in values])
+            report(('%s decode base %d' % (label, base)).strip(), dec, [(e, base) for e in encoded])
+
+
+def bench_b58(count=2000):
+    payloads = [b'\x00' + os.urandom(20) for i in range(count)]
+    addresses = encode_many(payloads)
+
+    def changebase_b58check(data):
+        # the generic path bin_to_b58check used before the b58 module
+        zeros = len(data) - len(data.lstrip(b'\x00'))
+        return '1' * zeros + changebase(data + bin_dbl_sha256(data)[:4], 256, 58)
+    report('b58check via changebase', changebase_b58check, [(p,) for p in payloads])
+    report('b58check_encode', b58check_encode, [(p,) for p in payloads])
+    report('encode_many', encode_many, [(payloads,)], count)
+    report('b58check_decode', b58check_decode, [(a,) for a in addresses])
+    report('decode_many', decode_many, [(addresses,)], count)
+
+
+def bench_addresses(count=500):
+    from pycryptotools.coins import Bitcoin
+    pubs = [privtopub(random.randrange(1, N)) for i in range(count)]
+    coin = Bitcoin()
+    report('Bitcoin.pubtoaddr', coin.pubtoaddr, [(pub,) for pub in pubs])
+    coin.enable_address_cache()
+    for pub in pubs:
+        coin.pubtoaddr(pub)
+    report('Bitcoin.pubtoaddr (cached)', coin.pubtoaddr, [(pub,) for pub in pubs])
+
+
+def bench_ripemd(count=300):
+    from pycryptotools import ripemd
+    digests = [os.urandom(32) for i in range(count)]
+    report('legacy RIPEMD160(32 bytes).digest()', _legacy_ripemd160, [(d,) for d in digests])
+    report('ripemd.RIPEMD160(32 bytes).digest()', lambda d: ripemd.RIPEMD160(d).digest(), [(d,) for d in digests])
+    report('ripemd.ripemd160(32 bytes)', ripemd.ripemd160, [(d,) for d in digests])
+    big = os.urandom(4096)
+    report('legacy RIPEMD160(4 KiB).digest()', _legacy_ripemd160, [(big,)])
+    report('ripemd.RIPEMD160(4 KiB).digest()', lambda d: ripemd.RIPEMD160(d).digest(), [(big,)])
+    previous = hash_backend()['ripemd160']
+    for name in available_hash_backends():
+        set_hash_backend(name)
+        report('bin_hash160 (%s)' % name, bin_hash160, [(d,) for d in digests])
+    pubkeys = [os.urandom(33) for i in range(20000)]
+    set_hash_backend('python')
+    report('hash160_many (python, %d keys)' % len(pubkeys), hash160_many, [(pubkeys,)], len(pubkeys))
+    set_hash_backend(previous)
+
+
+def bench_sighash(count=200):
+    tx = {'version': 1, 'locktime': 0, 'ins': [], 'outs': []}
+    for i in range(count):
+        tx['ins'].append({'outpoint': {'hash': os.urandom(32), 'index': i}, 'script': b'',
+                          'sequence': 0xffffffff, 'amount': 10000 + i, 'segwit': True})
+        tx['outs'].append({'value': 5000 + i, 'script': os.urandom(25)})
+    script = binascii.unhexlify(mk_p2wpkh_scriptcode(compress(privtopub(1))))
+    report('signature_form (%d inputs)' % count, signature_form, [(tx, i, script) for i in range(count)])
+    cache = SighashCache(tx)
+    report('signature_form with SighashCache', signature_form, [(tx, i, script, SIGHASH_ALL, cache) for i in range(count)])
+    report('multisign_inputs (per input)', multisign_inputs, [(tx, script, 1)], count)
+    for inp in tx['ins']:
+        del inp['segwit']
+    report('signature_form (legacy, %d inputs)' % count, signature_form, [(tx, i, script) for i in range(count)])
+
+
+def bench_parse(count=1000):
+    txs = []
+    for i in range(count):
+        tx = {'version': 2, 'locktime': 0, 'marker': 0, 'flag': 1, 'ins': [], 'outs': [], 'witness': []}
+        for j in range(2):
+            tx['ins'].append({'outpoint': {'hash': os.urandom(32), 'index': j}, 'script': b'', 'sequence': 0xffffffff})
+            tx['witness'].append({'number': 2, 'scriptCode': b'\x47' + os.urandom(71) + b'\x21' + os.urandom(33)})
+            tx['outs'].append({'value': 5000 + j, 'script': b'\x00\x14' + os.urandom(20)})
+        txs.append(serialize(tx))
+    stream = b''.join(txs)
+    hexed = [binascii.hexlify(tx).decode() for tx in txs]
+    report('deserialize (hex, %d txs)' % count, lambda: [deserialize(tx) for tx in hexed], [()], count)
+    report('deserialize (bytes)', lambda: [deserialize(tx) for tx in txs], [()], count)
+
+    def spends(stream):
+        return [(tx.outpoints(), tx.output_scripts()) for tx in parse_many(stream)]
+    report('parse_many outpoints and output scripts', spends, [(stream,)], count)
+
+
+def bench_msm(count=512):
+    pubs = [privtopub(random.randrange(1, N)) for i in range(count)]
+    pairs = [(pub, random.randrange(1, N)) for pub in pubs]
+
+    def naive(pairs):
+        total = (0, 0)
+        for pub, k in pairs:
+            total = fast_add(total, fast_multiply(decode_pubkey(pub), k))
+        return total
+    report('fast_add/fast_multiply loop', naive, [(pairs,)], count)
+    for n in (16, count):
+        report('multi_scalar_multiply (%d points)' % n, multi_scalar_multiply, [(pairs[:n],)], n)
+    report('sum_pubkeys', sum_pubkeys, [(pubs,)], count)
+
+
+BENCHMARKS = {
+    'parse': bench_parse,
+    'sighash': bench_sighash,
+    'ripemd': bench_ripemd,
+    'addresses': bench_addresses,
+    'b58': bench_b58,
+    'codecs': bench_codecs,
+    'messages': bench_messages,
+    'msm': bench_msm,
+    'multiply': bench_multiply,
+    'privtopub': bench_privtopub,
+    'sign': bench_sign,
+    'verify': bench_verify,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -1,6 +1,9 @@
+from .b58 import *
+from .backends import *
 from .blocks import *
 from .composite import *
 from .deterministic import *
+from .hashing import *
 from .main import *
 from .mnemonic import *
 from .py2specials import *
@@ -0,0 +1,104 @@
+import hashlib
+
+# Base58 and Base58Check (addresses, WIF keys, BIP32 keys)
+#
+# Numbers are converted ten base 58 digits at a time: 58**10 < 2**64, so
+# each big integer division yields a machine word that is split with
+# small integer arithmetic and a table of all two digit strings.
+
+B58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+_CHUNK = 10
+_CHUNK_BASE = 58 ** _CHUNK
+_PAIRS = [a + b for a in B58_ALPHABET for b in B58_ALPHABET]
+_VALUES = dict((c, i) for i, c in enumerate(B58_ALPHABET))
+_VALUES.update((ord(c), i) for i, c in enumerate(B58_ALPHABET))
+
+
+class Base58Error(ValueError):
+    pass
+
+
+def _checksum(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()[:4]
+
+
+def b58encode(data):
+    data = bytes(data)
+    n = int.from_bytes(data, 'big')
+    chunks = []
+    while n:
+        n, chunk = divmod(n, _CHUNK_BASE)
+        pairs = []
+        for i in range(_CHUNK // 2):
+            chunk, pair = divmod(chunk, 3364)
+            pairs.append(_PAIRS[pair])
+        pairs.reverse()
+        chunks.append(''.join(pairs))
+    chunks.reverse()
+    zeros = len(data) - len(data.lstrip(b'\x00'))
+    return '1' * zeros + ''.join(chunks).lstrip('1')
+
+
+def b58decode(string):
+    """Raises Base58Error on characters outside the alphabet"""
+    values = _VALUES
+    n = 0
+    try:
+        for i in range(0, len(string), _CHUNK):
+            chunk = string[i:i+_CHUNK]
+            value = 0
+            for c in chunk:
+                value = value * 58 + values[c]
+            n = n * 58 ** len(chunk) + value
+    except KeyError as e:
+        raise Base58Error("Invalid base58 character %r" % (e.args[0],))
+    zeros = len(string) - len(string.lstrip('1' if isinstance(string, str) else b'1'))
+    return b'\x00' * zeros + n.to_bytes((n.bit_length() + 7) // 8, 'big')
+
+
+def b58check_encode(data):
+    data = bytes(data)
+    return b58encode(data + _checksum(data))
+
+
+def b58check_decode(string):
+    """The data under the checksum, version bytes included"""
+    data = b58decode(string)
+    if len(data) < 4 or _checksum(data[:-4]) != data[-4:]:
+        raise Base58Error("Invalid checksum")
+    return data[:-4]
+
+
+def encode_many(datas, check=True):
+    encoder = b58check_encode if check else b58encode
+    return [encoder(data) for data in datas]
+
+
+def decode_many(strings, check=True):
+    decoder = b58check_decode if check else b58decode
+    return [decoder(string) for string in strings]
+
+
+def b58check_error(string, length=None, version=None):
+    """
+    None if string is valid Base58Check, else the reason why not. length is
+    the expected length of the decoded data, version the expected prefix
+    (an int for one byte or bytes).
+    """
+    try:
+        data = b58check_decode(string)
+    except Base58Error as e:
+        return str(e)
+    if length is not None and len(data) != length:
+        return "Invalid length %d, expected %d" % (len(data), length)
+    if version is not None:
+        if isinstance(version, int):
+            version = bytes([version])
+        if not data.startswith(version):
+            return "Invalid version bytes %s" % data[:len(version)].hex()
+    return None
+
+
+def is_b58check(string, length=None, version=None):
+    return b58check_error(string, length, version) is None
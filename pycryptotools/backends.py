@@ -0,0 +1,162 @@
+import os
+from abc import ABC, abstractmethod
+
+__all__ = ['EC_BACKEND_ENV', 'ECBackend', 'CoincurveBackend', 'register_backend',
+           'available_backends', 'set_backend', 'get_backend']
+
+# Elliptic curve backends
+#
+# main.py keeps the format handling (hex, wif, compressed...) and hands
+# decoded values to the active backend: scalars are ints in [1, N), points
+# are affine (x, y) tuples and message hashes are 32 bytes. Edge cases
+# (zero scalars, point at infinity, non canonical signatures) never reach
+# a backend, main.py handles them in pure Python.
+#
+# The backend is picked on first use: the PYCRYPTOTOOLS_EC_BACKEND
+# environment variable if set, else the available backend with the highest
+# priority. set_backend() changes it at runtime.
+
+EC_BACKEND_ENV = 'PYCRYPTOTOOLS_EC_BACKEND'
+
+_backends = {}
+_active = None
+
+
+class ECBackend(ABC):
+    """
+    Base class of EC backends. curve is None for generic backends that follow
+    the current main.Curve, or the name of the only curve a backend implements.
+    """
+
+    name = None
+    curve = None
+    priority = 0
+
+    def is_available(self):
+        return True
+
+    @abstractmethod
+    def privkey_to_point(self, priv):
+        pass
+
+    def prepare_key(self, priv):
+        """Backend form of a signing key, accepted by sign() in place of priv"""
+        return priv
+
+    @abstractmethod
+    def sign(self, msghash, priv):
+        """Returns (v, r, s) with low s and v = 27 + parity of R.y"""
+        pass
+
+    @abstractmethod
+    def verify(self, msghash, r, s, pub):
+        pass
+
+    @abstractmethod
+    def recover(self, msghash, recid, r, s):
+        """recid is the parity of R.y, returns the public point or False"""
+        pass
+
+    @abstractmethod
+    def tweak_add(self, pub, tweak):
+        """Returns pub + tweak*G"""
+        pass
+
+    @abstractmethod
+    def multiply(self, pub, priv):
+        """Returns priv*pub (ECDH shared point)"""
+        pass
+
+
+class CoincurveBackend(ECBackend):
+    """libsecp256k1 through the coincurve binding"""
+
+    name = 'coincurve'
+    curve = 'secp256k1'
+    priority = 10
+
+    def __init__(self):
+        try:
+            import coincurve
+        except ImportError:
+            coincurve = None
+        self.coincurve = coincurve
+
+    def is_available(self):
+        return self.coincurve is not None
+
+    def _pubkey(self, pub):
+        return self.coincurve.PublicKey.from_point(pub[0], pub[1])
+
+    def privkey_to_point(self, priv):
+        return self.coincurve.PrivateKey.from_int(priv).public_key.point()
+
+    def prepare_key(self, priv):
+        return self.coincurve.PrivateKey.from_int(priv)
+
+    def sign(self, msghash, priv):
+        if not isinstance(priv, self.coincurve.PrivateKey):
+            priv = self.prepare_key(priv)
+        sig = priv.sign_recoverable(msghash, hasher=None)
+        return 27 + (sig[64] & 1), int.from_bytes(sig[:32], 'big'), int.from_bytes(sig[32:64], 'big')
+
+    def verify(self, msghash, r, s, pub):
+        # libsecp256k1 only accepts low s, which verifies the same as s
+        s = min(s, _SECP256K1_N - s)
+        return self._pubkey(pub).verify(_der_encode(r, s), msghash, hasher=None)
+
+    def recover(self, msghash, recid, r, s):
+        sig = r.to_bytes(32, 'big') + s.to_bytes(32, 'big') + bytes([recid])
+        try:
+            return self.coincurve.PublicKey.from_signature_and_message(sig, msghash, hasher=None).point()
+        except ValueError:
+            return False
+
+    def tweak_add(self, pub, tweak):
+        return self._pubkey(pub).add(tweak.to_bytes(32, 'big')).point()
+
+    def multiply(self, pub, priv):
+        return self._pubkey(pub).multiply(priv.to_bytes(32, 'big')).point()
+
+
+_SECP256K1_N = 115792089237316195423570985008687907852837564279074904382605163141518161494337
+
+
+def _der_encode(r, s):
+    body = b''
+    for x in (r, s):
+        x = x.to_bytes((x.bit_length() + 8) // 8, 'big')
+        body += b'\x02' + bytes([len(x)]) + x
+    return b'\x30' + bytes([len(body)]) + body
+
+
+def register_backend(backend):
+    _backends[backend.name] = backend
+
+
+def available_backends():
+    """Names of the usable backends, preferred first"""
+    backends = sorted(_backends.values(), key=lambda b: -b.priority)
+    return [b.name for b in backends if b.is_available()]
+
+
+def set_backend(name='auto'):
+    global _active
+    if name == 'auto':
+        name = available_backends()[0]
+    backend = _backends.get(name)
+    if backend is None or not backend.is_available():
+        raise ValueError("EC backend %s is not available (choose from %s)" % (name, ', '.join(available_backends())))
+    _active = backend
+    return backend
+
+
+def get_backend(name=None):
+    if name is not None:
+        return _backends[name]
+    if _active is None:
+        return set_backend(os.environ.get(EC_BACKEND_ENV, 'auto'))
+    return _active
+
+
+register_backend(CoincurveBackend())
@@ -44,6 +44,8 @@ class BaseCoin(object):
     }
     electrum_xprv_headers = xprv_headers
     electrum_xpub_headers = xpub_headers
+    # opt-in memo of derived addresses, see enable_address_cache()
+    address_cache = None
 
     def __init__(self, testnet=False, **kwargs):
         if testnet:
@@ -57,6 +59,12 @@ class BaseCoin(object):
         self.explorers: List[pycryptotools.explorers.block_explorer.BlockExplorer] = []
         self.price_explorers: List[pycryptotools.explorers.price_explorer.PriceExplorer] = []
 
+    def __setattr__(self, name, value):
+        # cached addresses depend on the coin parameters (magicbyte, hrp...)
+        if self.address_cache is not None and name != 'address_cache' and not name.startswith('_'):
+            self.address_cache.clear()
+        object.__setattr__(self, name, value)
+
     ######################################
     #            BLOCK EXPLORER          #
     ######################################
@@ -132,6 +140,60 @@ class BaseCoin(object):
         addr = self.pubtoaddr(pub)
         return addr
 
+    ######################################
+    #            ADDRESS CACHE           #
+    ######################################
+
+    def enable_address_cache(self, maxsize=65536):
+        """
+        Memoize pubtoaddr, pubtolegacy and pubtosegwit results in an LRU
+        cache of maxsize entries
+        """
+        if self.address_cache is None:
+            self.address_cache = LRUCache(maxsize)
+        else:
+            self.address_cache.resize(maxsize)
+
+    def disable_address_cache(self):
+        self.address_cache = None
+
+    def clear_address_cache(self):
+        """
+        Drop the cached addresses, needed when something else than an
+        attribute of this coin (e.g. a class attribute) changes
+        """
+        if self.address_cache is not None:
+            self.address_cache.clear()
+
+    def address_cache_info(self):
+        """
+        Hits, misses, size and maxsize of the address cache, None when disabled
+        """
+        return None if self.address_cache is None else self.address_cache.info()
+
+    def cached_address(self, pubkey, script_type, derive, *args):
+        """
+        derive(pubkey, *args), memoized by pubkey, coin symbol, testnet and
+        script_type when the address cache is enabled. Hex and binary
+        pubkeys are distinct keys, as coins can treat them differently;
+        points are keyed by their type and encoding.
+        """
+        cache = self.address_cache
+        if cache is None:
+            return derive(pubkey, *args)
+        if isinstance(pubkey, (bytes, str)):
+            key = pubkey
+        elif isinstance(pubkey, bytearray):
+            key = bytes(pubkey)
+        else:
+            key = (type(pubkey), encode_pubkey(pubkey, 'bin'), getattr(pubkey, 'compressed', None))
+        key = (key, self.coin_symbol, self.is_testnet, script_type)
+        addr = cache.get(key)
+        if addr is None:
+            addr = derive(pubkey, *args)
+            cache.put(key, addr)
+        return addr
+
     def encode_privkey(self, privkey: bytes, formt=None, script_type="p2pkh"):
 
         if formt == None:
@@ -4,7 +4,7 @@ import re
 from .. import compress, pubtolegacy, electrum_pubkey, output_script_to_address, bin_to_b58check, \
     hex_to_b58check, hash160, segwit_addr, mk_p2w_scripthash_script, mk_scripthash_script, mk_pubkey_script, \
     mk_p2wpkh_script, privtopub, pubkey_to_hash, bin_sha256, safe_from_hex, mk_multisig_script, SIGHASH_ALL, \
-    magicbyte_to_prefix
+    magicbyte_to_prefix, Point
 from .base_coin import BaseCoin
 from ..explorers.blockstream_explorer import BlockstreamExplorer
 from ..explorers.coingate_price_explorer import Coingate
@@ -88,7 +88,10 @@ class Bitcoin(BaseCoin):
         """
         if use_compressed_addr == None:
             use_compressed_addr = self.use_compressed_addr
-        if use_compressed_addr and len(pubkey) == 65:
+        return self.cached_address(pubkey, ('p2pkh', use_compressed_addr), self._pubtolegacy, use_compressed_addr)
+
+    def _pubtolegacy(self, pubkey, use_compressed_addr):
+        if use_compressed_addr and (isinstance(pubkey, Point) or len(pubkey) == 65):
             pubkey = compress(pubkey)  # see main.py
         return pubtolegacy(pubkey, magicbyte=self.magicbyte)
 
@@ -184,7 +187,10 @@ class Bitcoin(BaseCoin):
         """
         if use_compressed_addr == None:
             use_compressed_addr = self.use_compressed_addr
-        if use_compressed_addr and len(pubkey) == 65:
+        return self.cached_address(pubkey, ('p2wpkh', use_compressed_addr), self._pubtosegwit, use_compressed_addr)
+
+    def _pubtosegwit(self, pubkey, use_compressed_addr):
+        if use_compressed_addr and (isinstance(pubkey, Point) or len(pubkey) == 65):
             pubkey = compress(pubkey)
         return self.hash_to_segwit_addr(pubkey_to_hash(pubkey))
 
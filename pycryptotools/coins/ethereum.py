@@ -1,6 +1,7 @@
 from eth_hash.auto import keccak
 
 from pycryptotools.coins.base_coin import BaseCoin
+from pycryptotools.main import Point, encode_pubkey
 from pycryptotools.explorers.blockscout_explorer import BlockscoutExplorer
 
 
@@ -43,6 +44,11 @@ class Ethereum(BaseCoin):
         """
         Get address from a public key
         """
+        return self.cached_address(pubkey, 'account', self._pubtoaddr)
+
+    def _pubtoaddr(self, pubkey):
+        if isinstance(pubkey, Point):
+            pubkey= encode_pubkey(pubkey, 'bin')
         size= len(pubkey)
         # ethereum use uncompressed address
         if size<64 or size>65:
@@ -39,11 +39,12 @@ def sign_coinvault_tx(tx, priv):
     subscript = deserialize_script(txobj['ins'][0]['script'])
     oscript = deserialize_script(subscript[-1])
     k, pubs = oscript[0], oscript[1:-2]
+    cache = SighashCache(tx)
     for j in range(len(txobj['ins'])):
         scr = deserialize_script(txobj['ins'][j]['script'])
         for i, p in enumerate(pubs):
             if p == pub:
-                scr[i+1] = multisign(tx, j, subscript[-1], priv)
+                scr[i+1] = multisign(tx, j, subscript[-1], priv, cache=cache)
         if len(filter(lambda x: x, scr[1:-1])) >= k:
             scr = [None] + filter(lambda x: x, scr[1:-1])[:k] + [scr[-1]]
         txobj['ins'][j]['script'] = serialize_script(scr)
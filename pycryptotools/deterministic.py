@@ -93,7 +93,7 @@ def raw_bip32_ckd(rawtuple, i, prefixes=DEFAULT):
         newkey = add_privkeys(I[:32]+B'\x01', priv)
         fingerprint = bin_hash160(privtopub(key))[:4]
     else:
-        newkey = add_pubkeys(compress(privtopub(I[:32])), key)
+        newkey = pubkey_tweak_add(key, I[:32])
         fingerprint = bin_hash160(key)[:4]
 
     return (vbytes, depth + 1, fingerprint, i, I[32:], newkey)
@@ -105,13 +105,11 @@ def bip32_serialize(rawtuple, prefixes=DEFAULT):
     chaincode = encode(hash_to_int(chaincode), 256, 32)
     keydata = b'\x00'+key[:-1] if vbytes == prefixes[0] else key
     bindata = vbytes + from_int_to_byte(depth % 256) + fingerprint + i + chaincode + keydata
-    return changebase(bindata+bin_dbl_sha256(bindata)[:4], 256, 58)
+    return b58check_encode(bindata)
 
 
 def bip32_deserialize(data, prefixes=DEFAULT):
-    dbin = changebase(data, 58, 256)
-    if bin_dbl_sha256(dbin[:-4])[:4] != dbin[-4:]:
-        raise Exception("Invalid checksum")
+    dbin = b58check_decode(data)
     vbytes = dbin[0:4]
     depth = from_byte_to_int(dbin[4])
     fingerprint = dbin[5:9]
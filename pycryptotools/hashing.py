@@ -0,0 +1,203 @@
+import hashlib
+import os
+
+from . import ripemd
+
+# Hash backends
+#
+# RIPEMD-160 is not always in hashlib: OpenSSL 3 only ships it in the
+# legacy provider. The implementations below are probed once, at import,
+# and the fastest working one is bound: hashlib, then pycryptodome, then
+# the pure Python ripemd module. PYCRYPTOTOOLS_HASH_BACKEND forces one of
+# them, set_hash_backend() changes it at runtime. SHA-256 always comes
+# from hashlib.
+
+HASH_BACKEND_ENV = 'PYCRYPTOTOOLS_HASH_BACKEND'
+
+_RIPEMD160_EMPTY = bytes.fromhex('9c1185a5c5e9fc54612808977ee8f548b2258d31')
+
+
+def _hashlib_ripemd160():
+    hashlib.new('ripemd160')
+
+    def digest(data):
+        return hashlib.new('ripemd160', data).digest()
+    return digest
+
+
+def _pycryptodome_ripemd160():
+    from Crypto.Hash import RIPEMD160
+
+    def digest(data):
+        return RIPEMD160.new(data).digest()
+    return digest
+
+
+def _python_ripemd160():
+    return ripemd.ripemd160
+
+
+_RIPEMD160_PROBES = [
+    ('hashlib', _hashlib_ripemd160),
+    ('pycryptodome', _pycryptodome_ripemd160),
+    ('python', _python_ripemd160),
+]
+
+
+def _probe_ripemd160():
+    backends = {}
+    for name, probe in _RIPEMD160_PROBES:
+        try:
+            digest = probe()
+            if digest(b'') == _RIPEMD160_EMPTY:
+                backends[name] = digest
+        except Exception:
+            pass
+    return backends
+
+
+_ripemd160_backends = _probe_ripemd160()
+
+_active = {'sha256': 'hashlib'}
+_sha256 = hashlib.sha256
+_ripemd160 = None
+
+
+def available_hash_backends():
+    """Names of the usable RIPEMD-160 implementations, fastest first"""
+    return [name for name, probe in _RIPEMD160_PROBES if name in _ripemd160_backends]
+
+
+def set_hash_backend(name='auto'):
+    global _ripemd160
+    if name == 'auto':
+        name = available_hash_backends()[0]
+    if name not in _ripemd160_backends:
+        raise ValueError("Hash backend %s is not available (choose from %s)" % (name, ', '.join(available_hash_backends())))
+    _ripemd160 = _ripemd160_backends[name]
+    _active['ripemd160'] = name
+    return name
+
+
+def hash_backend():
+    """The implementation in use for each hash function, e.g. {'sha256': 'hashlib', 'ripemd160': 'python'}"""
+    return dict(_active)
+
+
+def bin_ripemd160_digest(data):
+    return _ripemd160(data)
+
+
+def bin_hash160_digest(data):
+    return _ripemd160(_sha256(data).digest())
+
+
+# Batch hash160. SHA-256 digests are 32 bytes, so the RIPEMD-160 of every
+# key is a single block with the same padding: with NumPy and no native
+# RIPEMD-160, the 160 steps run once over uint32 arrays holding one lane
+# per key instead of once per key.
+
+HASH160_CHUNK = 65536
+
+# NumPy is imported on the first call that needs it, not with the package
+_numpy = None
+_numpy_loaded = False
+
+
+def _load_numpy():
+    global _numpy, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            pass
+    return _numpy
+
+
+_RMD_LEFT_WORDS = [
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15,
+    7, 4, 13, 1, 10, 6, 15, 3, 12, 0, 9, 5, 2, 14, 11, 8,
+    3, 10, 14, 4, 9, 15, 8, 1, 2, 7, 0, 6, 13, 11, 5, 12,
+    1, 9, 11, 10, 0, 8, 12, 4, 13, 3, 7, 15, 14, 5, 6, 2,
+    4, 0, 5, 9, 7, 12, 2, 10, 14, 1, 3, 8, 11, 6, 15, 13]
+_RMD_LEFT_SHIFTS = [
+    11, 14, 15, 12, 5, 8, 7, 9, 11, 13, 14, 15, 6, 7, 9, 8,
+    7, 6, 8, 13, 11, 9, 7, 15, 7, 12, 15, 9, 11, 7, 13, 12,
+    11, 13, 6, 7, 14, 9, 13, 15, 14, 8, 13, 6, 5, 12, 7, 5,
+    11, 12, 14, 15, 14, 15, 9, 8, 9, 14, 5, 6, 8, 6, 5, 12,
+    9, 15, 5, 11, 6, 8, 13, 12, 5, 12, 13, 14, 11, 8, 5, 6]
+_RMD_RIGHT_WORDS = [
+    5, 14, 7, 0, 9, 2, 11, 4, 13, 6, 15, 8, 1, 10, 3, 12,
+    6, 11, 3, 7, 0, 13, 5, 10, 14, 15, 8, 12, 4, 9, 1, 2,
+    15, 5, 1, 3, 7, 14, 6, 9, 11, 8, 12, 2, 10, 0, 4, 13,
+    8, 6, 4, 1, 3, 11, 15, 0, 5, 12, 2, 13, 9, 7, 10, 14,
+    12, 15, 10, 4, 1, 5, 8, 7, 6, 2, 13, 14, 0, 3, 9, 11]
+_RMD_RIGHT_SHIFTS = [
+    8, 9, 9, 11, 13, 15, 15, 5, 7, 7, 8, 11, 14, 14, 12, 6,
+    9, 13, 15, 7, 12, 8, 9, 11, 7, 7, 12, 7, 6, 15, 13, 11,
+    9, 7, 15, 11, 8, 6, 6, 14, 12, 13, 5, 14, 13, 13, 7, 5,
+    15, 5, 8, 11, 14, 14, 6, 14, 6, 9, 12, 9, 12, 5, 15, 8,
+    8, 5, 12, 9, 12, 5, 14, 6, 8, 13, 6, 5, 15, 13, 11, 11]
+_RMD_LEFT_K = [0x00000000, 0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xA953FD4E]
+_RMD_RIGHT_K = [0x50A28BE6, 0x5C4DD124, 0x6D703EF3, 0x7A6D76E9, 0x00000000]
+_RMD_FUNCTIONS = [
+    lambda x, y, z: x ^ y ^ z,
+    lambda x, y, z: (x & y) | (~x & z),
+    lambda x, y, z: (x | ~y) ^ z,
+    lambda x, y, z: (x & z) | (y & ~z),
+    lambda x, y, z: x ^ (y | ~z),
+]
+# 32 byte message, 0x80, zeros and the 256 bit length
+_RMD_DIGEST_PADDING = b'\x80' + b'\x00' * 23 + (256).to_bytes(8, 'little')
+
+
+def _ripemd160_line(x, state, words, shifts, constants, functions):
+    numpy = _numpy
+    a, b, c, d, e = state
+    for j in range(80):
+        s = shifts[j]
+        t = a + functions[j // 16](b, c, d) + x[words[j]] + numpy.uint32(constants[j // 16])
+        t = ((t << numpy.uint32(s)) | (t >> numpy.uint32(32 - s))) + e
+        a, e, d, c, b = e, d, (c << numpy.uint32(10)) | (c >> numpy.uint32(22)), b, t
+    return a, b, c, d, e
+
+
+def _ripemd160_lanes(digests):
+    # RIPEMD-160 of n 32 byte digests, given as one n*32 byte string
+    numpy = _numpy
+    n = len(digests) // 32
+    blocks = numpy.frombuffer(digests, dtype='<u4').reshape(n, 8)
+    padding = numpy.frombuffer(_RMD_DIGEST_PADDING, dtype='<u4')
+    x = [blocks[:, i].astype(numpy.uint32) for i in range(8)]
+    x += [numpy.full(n, w, dtype=numpy.uint32) for w in padding]
+    h = [numpy.full(n, v, dtype=numpy.uint32) for v in ripemd._INITIAL_STATE]
+    a, b, c, d, e = _ripemd160_line(x, h, _RMD_LEFT_WORDS, _RMD_LEFT_SHIFTS, _RMD_LEFT_K, _RMD_FUNCTIONS)
+    aa, bb, cc, dd, ee = _ripemd160_line(x, h, _RMD_RIGHT_WORDS, _RMD_RIGHT_SHIFTS, _RMD_RIGHT_K, _RMD_FUNCTIONS[::-1])
+    out = numpy.stack([h[1] + c + dd, h[2] + d + ee, h[3] + e + aa, h[4] + a + bb, h[0] + b + cc], axis=1)
+    return out.astype('<u4').tobytes()
+
+
+def hash160_many(pubkeys):
+    """
+    hash160 of every pubkey (bytes), as one bytes buffer of 20 byte
+    digests in input order
+    """
+    sha256 = _sha256
+    if _active['ripemd160'] != 'python' or _load_numpy() is None:
+        ripemd160 = _ripemd160
+        return b''.join([ripemd160(sha256(pub).digest()) for pub in pubkeys])
+    out = []
+    chunk = []
+    for pub in pubkeys:
+        chunk.append(sha256(pub).digest())
+        if len(chunk) == HASH160_CHUNK:
+            out.append(_ripemd160_lanes(b''.join(chunk)))
+            chunk = []
+    if chunk:
+        out.append(_ripemd160_lanes(b''.join(chunk)))
+    return b''.join(out)
+
+
+set_hash_backend(os.environ.get(HASH_BACKEND_ENV, 'auto'))
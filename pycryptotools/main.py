@@ -8,7 +8,20 @@ import base64
 import time
 import random
 import hmac
+import itertools
+import collections
+import contextlib
+import threading
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
 from .ripemd import *
+from .b58 import *
+from .hashing import *
+from .backends import *
+from .tablefile import *
+from . import segwit_addr
 
 # Elliptic curve parameters (secp256k1)
 
@@ -19,16 +32,116 @@ B = 7
 Gx = 55066263022277343669578718895168534326250603453777594175500187360389116729240
 Gy = 32670510020758816978083085130507043184471273380659243275938904335757337482424
 G = (Gx, Gy)
+SECP256K1_PARAMS = (P, N, A, B)
+
+# Curve contexts
+#
+# A Curve is immutable and owns its precomputation (generator tables...).
+# Arithmetic uses the curve bound to the current context (thread or
+# asyncio task) by use_curve() or Curve.run(), else the process-wide
+# default: secp256k1, or whatever change_curve() installed. The P, N, A,
+# B, G globals describe that default.
+
+
+class Curve(object):
+    __slots__ = ('name', 'p', 'n', 'a', 'b', 'g', 'params', 'sqrt_exp', 'glv', '_hash', '_cache')
+
+    def __init__(self, p, n, a, b, gx, gy, name=None):
+        init = object.__setattr__
+        init(self, 'name', name)
+        init(self, 'p', p)
+        init(self, 'n', n)
+        init(self, 'a', a)
+        init(self, 'b', b)
+        init(self, 'g', (gx, gy))
+        init(self, 'params', (p, n, a, b, (gx, gy)))
+        init(self, 'sqrt_exp', (p + 1) // 4)
+        init(self, 'glv', (p, n, a, b) == SECP256K1_PARAMS)
+        init(self, '_hash', hash(self.params))
+        init(self, '_cache', {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Curve objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Curve objects are immutable")
+
+    def __eq__(self, other):
+        return isinstance(other, Curve) and self.params == other.params
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return 'Curve(%s)' % (self.name or hex(self.p))
+
+    def cached(self, key, build):
+        """Per-curve precomputation, built on first use"""
+        try:
+            return self._cache[key]
+        except KeyError:
+            return self._cache.setdefault(key, build())
+
+    def run(self, fn, *args, **kwargs):
+        """Calls fn with this curve bound, e.g. curve.run(privtopub, priv)"""
+        with use_curve(self):
+            return fn(*args, **kwargs)
+
+
+SECP256K1 = Curve(P, N, A, B, Gx, Gy, 'secp256k1')
+_default_curve = SECP256K1
+
+if contextvars is not None:
+    _curve_context = contextvars.ContextVar('pycryptotools_curve')
+else:
+    import threading
+
+    class _ThreadLocalVar(threading.local):
+        # contextvars.ContextVar subset for python 3.6
+
+        def get(self, default):
+            return getattr(self, 'value', default)
+
+        def set(self, value):
+            token = getattr(self, 'value', None)
+            self.value = value
+            return token
+
+        def reset(self, token):
+            if token is None:
+                del self.value
+            else:
+                self.value = token
+
+    _curve_context = _ThreadLocalVar()
+
+
+def current_curve():
+    return _curve_context.get(_default_curve)
+
+
+@contextlib.contextmanager
+def use_curve(curve):
+    token = _curve_context.set(curve)
+    try:
+        yield curve
+    finally:
+        _curve_context.reset(token)
 
 
 def change_curve(p, n, a, b, gx, gy):
-    global P, N, A, B, Gx, Gy, G
+    global P, N, A, B, Gx, Gy, G, _default_curve
     P, N, A, B, Gx, Gy = p, n, a, b, gx, gy
     G = (Gx, Gy)
+    curve = Curve(p, n, a, b, gx, gy)
+    _default_curve = SECP256K1 if curve == SECP256K1 else curve
 
 
 def getG():
-    return G
+    return current_curve().g
 
 # Extended Euclidean Algorithm
 
@@ -89,26 +202,39 @@ def to_jacobian(p):
 
 
 def jacobian_double(p):
+    curve = current_curve()
+    P, A = curve.p, curve.a
     if not p[1]:
         return (0, 0, 0)
-    ysq = (p[1] ** 2) % P
-    S = (4 * p[0] * ysq) % P
-    M = (3 * p[0] ** 2 + A * p[2] ** 4) % P
-    nx = (M**2 - 2 * S) % P
-    ny = (M * (S - nx) - 8 * ysq ** 2) % P
-    nz = (2 * p[1] * p[2]) % P
+    x, y, z = p
+    ysq = (y * y) % P
+    S = (4 * x * ysq) % P
+    M = 3 * x * x
+    if A:
+        M += A * pow(z, 4, P)
+    M %= P
+    nx = (M * M - 2 * S) % P
+    ny = (M * (S - nx) - 8 * ysq * ysq) % P
+    nz = (2 * y * z) % P
     return (nx, ny, nz)
 
 
 def jacobian_add(p, q):
+    P = current_curve().p
     if not p[1]:
         return q
     if not q[1]:
         return p
-    U1 = (p[0] * q[2] ** 2) % P
-    U2 = (q[0] * p[2] ** 2) % P
-    S1 = (p[1] * q[2] ** 3) % P
-    S2 = (q[1] * p[2] ** 3) % P
+    if q[2] == 1:
+        return jacobian_add_affine(p, q)
+    if p[2] == 1:
+        return jacobian_add_affine(q, p)
+    pz2 = (p[2] * p[2]) % P
+    qz2 = (q[2] * q[2]) % P
+    U1 = (p[0] * qz2) % P
+    U2 = (q[0] * pz2) % P
+    S1 = (p[1] * qz2 * q[2]) % P
+    S2 = (q[1] * pz2 * p[2]) % P
     if U1 == U2:
         if S1 != S2:
             return (0, 0, 1)
@@ -118,37 +244,548 @@ def jacobian_add(p, q):
     H2 = (H * H) % P
     H3 = (H * H2) % P
     U1H2 = (U1 * H2) % P
-    nx = (R ** 2 - H3 - 2 * U1H2) % P
+    nx = (R * R - H3 - 2 * U1H2) % P
     ny = (R * (U1H2 - nx) - S1 * H3) % P
     nz = (H * p[2] * q[2]) % P
     return (nx, ny, nz)
 
 
+def jacobian_add_affine(p, q):
+    P = current_curve().p
+    # Mixed addition, q has Z = 1 (affine point or table entry)
+    if not p[1]:
+        return q
+    if not q[1]:
+        return p
+    x, y, z = p
+    z2 = (z * z) % P
+    U2 = (q[0] * z2) % P
+    S2 = (q[1] * z2 * z) % P
+    if x == U2:
+        if y != S2:
+            return (0, 0, 1)
+        return jacobian_double(p)
+    H = U2 - x
+    R = S2 - y
+    H2 = (H * H) % P
+    H3 = (H * H2) % P
+    U1H2 = (x * H2) % P
+    nx = (R * R - H3 - 2 * U1H2) % P
+    ny = (R * (U1H2 - nx) - y * H3) % P
+    nz = (H * z) % P
+    return (nx, ny, nz)
+
+
 def from_jacobian(p):
+    P = current_curve().p
     z = inv(p[2], P)
     return ((p[0] * z**2) % P, (p[1] * z**3) % P)
 
 
+# Width-w non-adjacent form: odd digits in (-2**(w-1), 2**(w-1)) separated
+# by at least w-1 zeros, least significant first
+
+
+def to_wnaf(n, w):
+    digits = []
+    full, half = 2**w, 2**(w-1)
+    while n:
+        if n & 1:
+            d = n & (full - 1)
+            if d >= half:
+                d -= full
+            n -= d
+        else:
+            d = 0
+        digits.append(d)
+        n >>= 1
+    return digits
+
+
+WNAF_WINDOW = 5
+
+
+def _odd_multiples(a, w):
+    P = current_curve().p
+    # a, 3a, 5a, ..., (2**(w-1) - 1)a and their negations
+    twice = jacobian_double(a)
+    pos = [a]
+    for i in range(2**(w-2) - 1):
+        pos.append(jacobian_add(pos[-1], twice))
+    neg = [(p[0], (P - p[1]) % P, p[2]) for p in pos]
+    return pos, neg
+
+
+def _jacobian_interleave(terms):
+    # Strauss: one shared doubling chain for several (pos, neg, digits)
+    schedule = [[] for i in range(max(len(t[2]) for t in terms))]
+    for pos, neg, digits in terms:
+        for i, d in enumerate(digits):
+            if d > 0:
+                schedule[i].append(pos[d >> 1])
+            elif d < 0:
+                schedule[i].append(neg[-d >> 1])
+    result = (0, 0, 1)
+    for i in range(len(schedule) - 1, -1, -1):
+        result = jacobian_double(result)
+        for q in schedule[i]:
+            result = jacobian_add(result, q)
+    return result
+
+# GLV endomorphism, secp256k1 only: lambda * (x, y) = (beta * x, y), and
+# every scalar splits into k1 + k2 * lambda with k1, k2 of about 128 bits
+
+GLV_LAMBDA = 0x5363ad4cc05c30e0a5261c028812645a122e22ea20816678df02967c1b23bd72
+GLV_BETA = 0x7ae96a2b657c07106e64479eac3434e99cf0497512f58995c1396c28719501ee
+GLV_A1 = 0x3086d221a7d46bcde86c90e49284eb15
+GLV_B1 = -0xe4437ed6010e88286f547fa90abfe4c3
+GLV_A2 = 0x114ca50f7a8e2f3f657c1108d9d44cfd8
+GLV_B2 = GLV_A1
+
+
+def glv_enabled():
+    return current_curve().glv
+
+
+def glv_split(n):
+    N = current_curve().n
+    c1 = (GLV_B2 * n + N // 2) // N
+    c2 = (-GLV_B1 * n + N // 2) // N
+    return n - c1 * GLV_A1 - c2 * GLV_A2, -c1 * GLV_B1 - c2 * GLV_B2
+
+
+def _glv_tables(pos, neg):
+    P = current_curve().p
+    lpos = [((GLV_BETA * p[0]) % P, p[1], p[2]) for p in pos]
+    lneg = [((GLV_BETA * p[0]) % P, p[1], p[2]) for p in neg]
+    return pos, neg, lpos, lneg
+
+
+def _glv_terms(tables, n, w):
+    k1, k2 = glv_split(n)
+    pos, neg, lpos, lneg = tables
+    if k1 < 0:
+        k1, pos, neg = -k1, neg, pos
+    if k2 < 0:
+        k2, lpos, lneg = -k2, lneg, lpos
+    return [(pos, neg, to_wnaf(k1, w)), (lpos, lneg, to_wnaf(k2, w))]
+
+
 def jacobian_multiply(a, n):
+    N = current_curve().n
     if a[1] == 0 or n == 0:
         return (0, 0, 1)
+    if n < 0 or n >= N:
+        n %= N
+        if n == 0:
+            return (0, 0, 1)
     if n == 1:
         return a
-    if n < 0 or n >= N:
-        return jacobian_multiply(a, n % N)
-    if (n % 2) == 0:
-        return jacobian_double(jacobian_multiply(a, n//2))
-    if (n % 2) == 1:
-        return jacobian_add(jacobian_double(jacobian_multiply(a, n//2)), a)
+    pos, neg = _odd_multiples(a, WNAF_WINDOW)
+    if glv_enabled():
+        return _jacobian_interleave(_glv_terms(_glv_tables(pos, neg), n, WNAF_WINDOW))
+    return _jacobian_interleave([(pos, neg, to_wnaf(n, WNAF_WINDOW))])
+
+# Joint multiplication n*a + m*b (Shamir's trick): both scalars share one
+# doubling chain. Odd multiples of G use a wider window and are cached.
+
+G_WNAF_WINDOW = 7
+
+
+def _build_generator_odd_multiples():
+    P = current_curve().p
+    pos, neg = _odd_multiples(to_jacobian(current_curve().g), G_WNAF_WINDOW)
+    pos = [(x, y, 1) for x, y in batch_from_jacobian(pos)]
+    neg = [(x, (P - y) % P, 1) for x, y, z in pos]
+    return _glv_tables(pos, neg)
+
+
+def _generator_odd_multiples():
+    return current_curve().cached(('g_odd_multiples', G_WNAF_WINDOW), _build_generator_odd_multiples)
+
+
+def _scalar_terms(a, n):
+    curve = current_curve()
+    N, G = curve.n, curve.g
+    n %= N
+    if not n or not a[1]:
+        return []
+    if a[2] == 1 and (a[0], a[1]) == G:
+        w = G_WNAF_WINDOW
+        tables = _generator_odd_multiples()
+    else:
+        w = WNAF_WINDOW
+        tables = _odd_multiples(a, w)
+        if glv_enabled():
+            tables = _glv_tables(*tables)
+    if glv_enabled():
+        terms = _glv_terms(tables, n, w)
+        return [t for t in terms if t[2]]
+    return [(tables[0], tables[1], to_wnaf(n, w))]
+
+
+def jacobian_shamir(a, n, b, m):
+    terms = _scalar_terms(a, n) + _scalar_terms(b, m)
+    if not terms:
+        return (0, 0, 1)
+    return _jacobian_interleave(terms)
+
+
+def fast_shamir(a, n, b, m):
+    return from_jacobian(jacobian_shamir(to_jacobian(a), n, to_jacobian(b), m))
+
+# Multi-scalar multiplication sum(k_i * P_i). Few points: Strauss, i.e.
+# the interleaved wNAF above. Many points: Pippenger's bucket method, whose
+# cost per point shrinks as the window grows with the number of points.
+
+PIPPENGER_THRESHOLD = 64
+
+
+def _pippenger_window(count):
+    return max(2, min(count.bit_length() - 2, 16))
+
+
+def _signed_digits(k, c):
+    # base 2**c digits in (-2**(c-1), 2**(c-1)], least significant first
+    digits = []
+    full, half = 2**c, 2**(c-1)
+    while k:
+        d = k & (full - 1)
+        k >>= c
+        if d > half:
+            d -= full
+            k += 1
+        digits.append(d)
+    return digits
+
+
+def _jacobian_pippenger(pairs):
+    curve = current_curve()
+    P, N = curve.p, curve.n
+    points, scalars = [], []
+    for a, n in pairs:
+        n %= N
+        if not n or not a[1]:
+            continue
+        neg = (a[0], (P - a[1]) % P, a[2])
+        if glv_enabled():
+            k1, k2 = glv_split(n)
+            la, lneg = ((GLV_BETA * a[0]) % P, a[1], a[2]), ((GLV_BETA * a[0]) % P, neg[1], a[2])
+            points += [(a, neg) if k1 >= 0 else (neg, a), (la, lneg) if k2 >= 0 else (lneg, la)]
+            scalars += [abs(k1), abs(k2)]
+        else:
+            points.append((a, neg))
+            scalars.append(n)
+    if not points:
+        return (0, 0, 1)
+    c = _pippenger_window(len(points))
+    digits = [_signed_digits(k, c) for k in scalars]
+    result = (0, 0, 1)
+    for i in range(max(len(d) for d in digits) - 1, -1, -1):
+        for j in range(c):
+            result = jacobian_double(result)
+        buckets = [(0, 0, 1)] * 2**(c-1)
+        for (pos, neg), ds in zip(points, digits):
+            if i < len(ds):
+                d = ds[i]
+                if d > 0:
+                    buckets[d-1] = jacobian_add(buckets[d-1], pos)
+                elif d < 0:
+                    buckets[-d-1] = jacobian_add(buckets[-d-1], neg)
+        # sum of d * bucket[d-1] with two running sums
+        running = total = (0, 0, 1)
+        for b in reversed(buckets):
+            running = jacobian_add(running, b)
+            total = jacobian_add(total, running)
+        result = jacobian_add(result, total)
+    return result
+
+
+def jacobian_multi_scalar_multiply(pairs):
+    pairs = list(pairs)
+    if len(pairs) >= PIPPENGER_THRESHOLD:
+        return _jacobian_pippenger(pairs)
+    terms = []
+    for a, n in pairs:
+        terms += _scalar_terms(a, n)
+    if not terms:
+        return (0, 0, 1)
+    return _jacobian_interleave(terms)
+
+
+def multi_scalar_multiply(pairs):
+    """
+    Returns the sum of k*pubkey over (pubkey, k) pairs, encoded like the
+    first pubkey. Scalars may be any privkey format.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return (0, 0)
+    f = get_pubkey_format(pairs[0][0])
+    jpairs = [(to_jacobian(decode_pubkey(pub)), decode_privkey(k)) for pub, k in pairs]
+    return encode_pubkey(from_jacobian(jacobian_multi_scalar_multiply(jpairs)), f)
+
+
+def sum_pubkeys(pubkeys):
+    """Sum of pubkeys with one inversion, encoded like the first one"""
+    pubkeys = list(pubkeys)
+    if not pubkeys:
+        return (0, 0)
+    f = get_pubkey_format(pubkeys[0])
+    result = (0, 0, 1)
+    for pub in pubkeys:
+        result = jacobian_add_affine(result, to_jacobian(decode_pubkey(pub)))
+    return encode_pubkey(from_jacobian(result), f)
 
 
 def fast_multiply(a, n):
+    G = current_curve().g
+    if tuple(a) == G:
+        return fast_base_multiply(n)
     return from_jacobian(jacobian_multiply(to_jacobian(a), n))
 
 
 def fast_add(a, b):
     return from_jacobian(jacobian_add(to_jacobian(a), to_jacobian(b)))
 
+
+def batch_inv(values, n):
+    # Montgomery's trick: one modular inversion for the whole list,
+    # zero entries map to 0 like inv()
+    acc, prefix = 1, []
+    for a in values:
+        prefix.append(acc)
+        if a % n:
+            acc = (acc * a) % n
+    acc = inv(acc, n)
+    out = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        a = values[i]
+        if a % n:
+            out[i] = (acc * prefix[i]) % n
+            acc = (acc * a) % n
+    return out
+
+
+def batch_from_jacobian(points):
+    P = current_curve().p
+    zs = batch_inv([p[2] for p in points], P)
+    out = []
+    for p, z in zip(points, zs):
+        z2 = (z * z) % P
+        out.append(((p[0] * z2) % P, (p[1] * z2 * z) % P))
+    return out
+
+# Fixed-base multiplication by the generator
+#
+# The table holds d * 2**(w*i) * G for every window i and digit d in
+# [1, 2**w), so k*G costs one addition per non-zero window of k and no
+# doublings. It is built on first use and cached by the curve, or mapped
+# from the file named by PYCRYPTOTOOLS_G_TABLE (see save_generator_table):
+# a missing, stale or corrupted file falls back to building the table.
+# precompute() builds the same table for any other point.
+
+G_TABLE_WINDOW = 4
+G_TABLE_ENV = 'PYCRYPTOTOOLS_G_TABLE'
+
+
+def _build_fixed_base_table(a, window):
+    N = current_curve().n
+    rows = []
+    base = to_jacobian(a)
+    for i in range((N.bit_length() + window - 1) // window):
+        row = [base]
+        for d in range(2, 2**window):
+            row.append(jacobian_add(row[-1], base))
+        rows.append(row)
+        base = jacobian_add(row[-1], base)
+    flat = batch_from_jacobian([p for row in rows for p in row])
+    width = 2**window - 1
+    return [[(x, y, 1) for x, y in flat[i:i+width]]
+            for i in range(0, len(flat), width)]
+
+
+def _load_generator_table(curve, path):
+    if path:
+        table = load_table(path, curve.params)
+        if table is not None:
+            return table.window, table
+    return G_TABLE_WINDOW, _build_fixed_base_table(curve.g, G_TABLE_WINDOW)
+
+
+def _generator_table():
+    curve, path = current_curve(), os.environ.get(G_TABLE_ENV)
+    return curve.cached(('g_table', G_TABLE_WINDOW, path), lambda: _load_generator_table(curve, path))
+
+
+def save_generator_table(path, window=8):
+    """
+    Writes the generator table of the current curve to path, to be mapped
+    by processes started with PYCRYPTOTOOLS_G_TABLE=path. Wider windows
+    make bigger files (about 0.5MB at 8 bits) and faster multiplications.
+    """
+    curve = current_curve()
+    write_table(path, _build_fixed_base_table(curve.g, window), window, curve.params)
+
+
+def _fixed_base_multiply(table, window, n):
+    mask = 2**window - 1
+    result = (0, 0, 1)
+    i = 0
+    while n:
+        d = n & mask
+        if d:
+            result = jacobian_add_affine(result, table[i][d-1])
+        n >>= window
+        i += 1
+    return result
+
+
+def jacobian_base_multiply(n):
+    N = current_curve().n
+    window, table = _generator_table()
+    return _fixed_base_multiply(table, window, n % N)
+
+
+def fast_base_multiply(n):
+    return from_jacobian(jacobian_base_multiply(n))
+
+
+PRECOMPUTE_WINDOW = 6
+
+
+class PrecomputedPoint(object):
+    """
+    Handle for a point multiplied by many scalars (a fixed scan or server
+    key): the pubkey is decoded and checked once, and its window table is
+    built on the first pure Python multiply. Accepted by multiply() and
+    the stealth sender functions in place of the scan and spend pubkeys;
+    on the receiver side the point changes with every payment, so there is
+    nothing to precompute. The handle keeps the curve that was active when
+    it was created.
+    """
+    __slots__ = ('pubkey', 'point', 'window', 'curve', '_table')
+
+    def __init__(self, pubkey, window=PRECOMPUTE_WINDOW):
+        curve = current_curve()
+        P, A, B = curve.p, curve.a, curve.b
+        point = decode_pubkey(pubkey)
+        if isinf(point) or (point[0]**3+A*point[0]+B-point[1]*point[1]) % P != 0:
+            raise Exception("Point not on curve")
+        self.pubkey = pubkey
+        self.point = point
+        self.window = window
+        self.curve = curve
+        self._table = None
+
+    def table(self):
+        if self._table is None:
+            self._table = self.curve.run(_build_fixed_base_table, self.point, self.window)
+        return self._table
+
+    def jacobian_multiply(self, n):
+        return self.curve.run(_fixed_base_multiply, self.table(), self.window, n % self.curve.n)
+
+    def multiply(self, privkey):
+        """privkey * point, encoded like the precomputed pubkey"""
+        with use_curve(self.curve):
+            n = decode_privkey(privkey) % self.curve.n
+            if not n:
+                point = (0, 0)
+            elif ec_backend() is python_backend:
+                point = from_jacobian(self.jacobian_multiply(n))
+            else:
+                point = _ec_call('multiply', self.point, n)
+            return encode_pubkey(point, get_pubkey_format(self.pubkey))
+
+
+def precompute(pubkey, window=PRECOMPUTE_WINDOW):
+    return PrecomputedPoint(pubkey, window)
+
+# Bounded least recently used cache with hit/miss counters, safe to share
+# between threads
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > max(maxsize, 0):
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+# Decompressed points by (33 byte compressed encoding, curve), used by
+# decode_pubkey (and so by multiply, add_pubkeys...) to skip the square
+# root. A size of 0 disables it.
+
+DECOMPRESSION_CACHE_SIZE = 4096
+decompression_cache = LRUCache(DECOMPRESSION_CACHE_SIZE)
+
+
+def set_decompression_cache_size(size):
+    decompression_cache.resize(size)
+
+
+def decompression_cache_info():
+    return decompression_cache.info()
+
+
+def _decompress_point(pub):
+    curve = current_curve()
+    key = (bytes(pub), curve)
+    point = decompression_cache.get(key)
+    if point is None:
+        P, A, B = curve.p, curve.a, curve.b
+        x = decode(pub[1:33], 256)
+        beta = pow(x*x*x+A*x+B, curve.sqrt_exp, P)
+        y = (P-beta) if ((beta + from_byte_to_int(pub[0])) % 2) else beta
+        point = (x, y)
+        decompression_cache.put(key, point)
+    return point
+
 # Functions for handling pubkey and privkey formats
 
 
@@ -162,7 +799,9 @@ def get_pubkey_format(pub):
         three = 3
         four = 4
 
-    if isinstance(pub, (tuple, list)): return 'decimal'
+    if isinstance(pub, Point):
+        return 'object_compressed' if getattr(pub, 'compressed', False) else 'object'
+    elif isinstance(pub, (tuple, list)): return 'decimal'
     elif len(pub) == 65 and pub[0] == four: return 'bin'
     elif len(pub) == 130 and pub[0:2] == '04': return 'hex'
     elif len(pub) == 33 and pub[0] in [two, three]: return 'bin_compressed'
@@ -173,7 +812,19 @@ def get_pubkey_format(pub):
 
 
 def encode_pubkey(pub, formt):
-    if not isinstance(pub, (tuple, list)):
+    if isinstance(pub, Point):
+        if formt in ('object', 'object_compressed'):
+            compressed = formt == 'object_compressed'
+            if getattr(pub, 'compressed', None) == compressed:
+                return pub
+            key = PublicKey(pub.x, pub.y, compressed)
+            if isinstance(pub, PublicKey):
+                key._encodings = pub._encodings
+            return key
+        elif isinstance(pub, PublicKey):
+            return pub.encode(formt)
+        pub = (pub.x, pub.y)
+    elif not isinstance(pub, (tuple, list)):
         pub = decode_pubkey(pub)
     if formt == 'decimal': return pub
     elif formt == 'bin': return b'\x04' + encode(pub[0], 256, 32) + encode(pub[1], 256, 32)
@@ -184,18 +835,17 @@ def encode_pubkey(pub, formt):
         return '0'+str(2+(pub[1] % 2)) + encode(pub[0], 16, 64)
     elif formt == 'bin_electrum': return encode(pub[0], 256, 32) + encode(pub[1], 256, 32)
     elif formt == 'hex_electrum': return encode(pub[0], 16, 64) + encode(pub[1], 16, 64)
+    elif formt == 'object': return PublicKey(pub[0], pub[1], False)
+    elif formt == 'object_compressed': return PublicKey(pub[0], pub[1])
     else: raise Exception("Invalid format!")
 
 
 def decode_pubkey(pub, formt=None):
     if not formt: formt = get_pubkey_format(pub)
     if formt == 'decimal': return pub
+    elif formt in ('object', 'object_compressed'): return (pub.x, pub.y)
     elif formt == 'bin': return (decode(pub[1:33], 256), decode(pub[33:65], 256))
-    elif formt == 'bin_compressed':
-        x = decode(pub[1:33], 256)
-        beta = pow(int(x*x*x+A*x+B), int((P+1)//4), int(P))
-        y = (P-beta) if ((beta + from_byte_to_int(pub[0])) % 2) else beta
-        return (x, y)
+    elif formt == 'bin_compressed': return _decompress_point(pub)
     elif formt == 'hex': return (decode(pub[2:66], 16), decode(pub[66:130], 16))
     elif formt == 'hex_compressed':
         return decode_pubkey(safe_from_hex(pub), 'bin_compressed')
@@ -207,6 +857,8 @@ def decode_pubkey(pub, formt=None):
 
 def get_privkey_format(priv):
     if isinstance(priv, int_types): return 'decimal'
+    elif isinstance(priv, PrivateKey):
+        return 'object_compressed' if priv.compressed else 'object'
     elif len(priv) == 32: return 'bin'
     elif len(priv) == 33: return 'bin_compressed'
     elif len(priv) == 64: return 'hex'
@@ -229,11 +881,14 @@ def encode_privkey(priv, formt, vbyte=128):
         return bin_to_b58check(encode(priv, 256, 32), int(vbyte))
     elif formt == 'wif_compressed':
         return bin_to_b58check(encode(priv, 256, 32) + b'\x01', int(vbyte))
+    elif formt == 'object': return PrivateKey(priv, False)
+    elif formt == 'object_compressed': return PrivateKey(priv)
     else: raise Exception("Invalid format!")
 
 def decode_privkey(priv,formt=None):
     if not formt: formt = get_privkey_format(priv)
     if formt == 'decimal': return priv
+    elif formt in ('object', 'object_compressed'): return priv.secret
     elif formt == 'bin': return decode(priv, 256)
     elif formt == 'bin_compressed': return decode(priv[:32], 256)
     elif formt == 'hex': return decode(priv, 16)
@@ -243,29 +898,228 @@ def decode_privkey(priv,formt=None):
         return decode(b58check_to_bin(priv)[:32],256)
     else: raise Exception("WIF does not represent privkey")
 
+# Key objects: decoded once, they keep their integers and cache their
+# encodings. The functional API accepts them anywhere a key is expected
+# (format 'object' or 'object_compressed') and returns the same type.
+
+_PUBKEY_CACHED_FORMATS = ('bin', 'bin_compressed', 'hex', 'hex_compressed')
+
+
+class Point(object):
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __iter__(self):
+        return iter((self.x, self.y))
+
+    def __getitem__(self, i):
+        return (self.x, self.y)[i]
+
+    def __eq__(self, other):
+        if isinstance(other, Point):
+            return self.x == other.x and self.y == other.y
+        return isinstance(other, (tuple, list)) and tuple(other) == (self.x, self.y)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __repr__(self):
+        return '%s(%d, %d)' % (type(self).__name__, self.x, self.y)
+
+
+class PublicKey(Point):
+    """
+    A point plus its preferred serialization (compressed or not), with the
+    bin/hex encodings and the hash160 computed on first use
+    """
+    __slots__ = ('compressed', '_encodings', '_hash160')
+
+    def __init__(self, x, y, compressed=True):
+        Point.__init__(self, x, y)
+        self.compressed = compressed
+        self._encodings = {}
+        self._hash160 = None
+
+    @classmethod
+    def from_pubkey(cls, pub):
+        f = get_pubkey_format(pub)
+        if isinstance(pub, cls):
+            return pub
+        x, y = decode_pubkey(pub, f)
+        key = cls(x, y, 'compressed' in f)
+        if f in _PUBKEY_CACHED_FORMATS:
+            key._encodings[f] = pub
+        return key
+
+    def encode(self, formt):
+        if formt not in _PUBKEY_CACHED_FORMATS:
+            return encode_pubkey((self.x, self.y), formt)
+        try:
+            return self._encodings[formt]
+        except KeyError:
+            enc = self._encodings[formt] = encode_pubkey((self.x, self.y), formt)
+            return enc
+
+    def serialize(self):
+        return self.encode('bin_compressed' if self.compressed else 'bin')
+
+    def hex(self):
+        return self.encode('hex_compressed' if self.compressed else 'hex')
+
+    def hash160(self):
+        if self._hash160 is None:
+            self._hash160 = bin_hash160(self.serialize())
+        return self._hash160
+
+
+class PrivateKey(object):
+    __slots__ = ('secret', 'compressed', '_public_key')
+
+    def __init__(self, secret, compressed=True):
+        self.secret = secret
+        self.compressed = compressed
+        self._public_key = None
+
+    @classmethod
+    def from_privkey(cls, priv):
+        if isinstance(priv, cls):
+            return priv
+        f = get_privkey_format(priv)
+        return cls(decode_privkey(priv, f), 'compressed' in f)
+
+    @property
+    def public_key(self):
+        return privkey_to_pubkey(self)
+
+    def encode(self, formt, vbyte=128):
+        return encode_privkey(self.secret, formt, vbyte)
+
+    def __eq__(self, other):
+        return isinstance(other, PrivateKey) and (self.secret, self.compressed) == (other.secret, other.compressed)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.secret, self.compressed))
+
+    def __repr__(self):
+        return 'PrivateKey(<hidden>)'
+
+
+class JacobianPoint(object):
+    """
+    A point kept in jacobian coordinates: +, -, * and tweak_add never
+    normalise, so a chain of operations costs a single inversion when the
+    result is finally encoded. Operands may be pubkeys in any format.
+    """
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x, y, z=1):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    @classmethod
+    def from_pubkey(cls, pub):
+        if isinstance(pub, cls):
+            return pub
+        x, y = decode_pubkey(pub)
+        return cls(x, y, 1)
+
+    @classmethod
+    def base_multiply(cls, k):
+        return cls(*jacobian_base_multiply(decode_privkey(k)))
+
+    def jacobian(self):
+        return (self.x, self.y, self.z)
+
+    def is_infinity(self):
+        return not self.y
+
+    def __add__(self, other):
+        return JacobianPoint(*jacobian_add(self.jacobian(), JacobianPoint.from_pubkey(other).jacobian()))
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        P = current_curve().p
+        return JacobianPoint(self.x, (P - self.y) % P, self.z)
+
+    def __sub__(self, other):
+        return self + (-JacobianPoint.from_pubkey(other))
+
+    def __mul__(self, k):
+        return JacobianPoint(*jacobian_multiply(self.jacobian(), decode_privkey(k)))
+
+    __rmul__ = __mul__
+
+    def tweak_add(self, k):
+        """self + k*G"""
+        return self + JacobianPoint.base_multiply(k)
+
+    def to_affine(self):
+        if self.is_infinity():
+            return (0, 0)
+        return from_jacobian(self.jacobian())
+
+    def encode(self, formt='hex_compressed'):
+        return encode_pubkey(self.to_affine(), formt)
+
+    def __eq__(self, other):
+        P = current_curve().p
+        if not isinstance(other, JacobianPoint):
+            return NotImplemented
+        if self.is_infinity() or other.is_infinity():
+            return self.is_infinity() and other.is_infinity()
+        z1, z2 = self.z * self.z, other.z * other.z
+        return ((self.x * z2 - other.x * z1) % P == 0 and
+                (self.y * z2 * other.z - other.y * z1 * self.z) % P == 0)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'JacobianPoint(%d, %d, %d)' % (self.x, self.y, self.z)
+
+
 def add_pubkeys(p1, p2):
     f1, f2 = get_pubkey_format(p1), get_pubkey_format(p2)
     return encode_pubkey(fast_add(decode_pubkey(p1, f1), decode_pubkey(p2, f2)), f1)
 
 def add_privkeys(p1, p2):
+    N = current_curve().n
     f1, f2 = get_privkey_format(p1), get_privkey_format(p2)
     return encode_privkey((decode_privkey(p1, f1) + decode_privkey(p2, f2)) % N, f1)
 
 
 def mul_privkeys(p1, p2):
+    N = current_curve().n
     f1, f2 = get_privkey_format(p1), get_privkey_format(p2)
     return encode_privkey((decode_privkey(p1, f1) * decode_privkey(p2, f2)) % N, f1)
 
 def multiply(pubkey, privkey):
+    curve = current_curve()
+    P, N, B = curve.p, curve.n, curve.b
+    if isinstance(pubkey, PrecomputedPoint):
+        return pubkey.multiply(privkey)
     f1, f2 = get_pubkey_format(pubkey), get_privkey_format(privkey)
     pubkey, privkey = decode_pubkey(pubkey, f1), decode_privkey(privkey, f2)
     # http://safecurves.cr.yp.to/twist.html
     if not isinf(pubkey) and (pubkey[0]**3+B-pubkey[1]*pubkey[1]) % P != 0:
         raise Exception("Point not on curve")
-    return encode_pubkey(fast_multiply(pubkey, privkey), f1)
+    if isinf(pubkey) or not privkey % N:
+        return encode_pubkey(fast_multiply(pubkey, privkey), f1)
+    return encode_pubkey(_ec_call('multiply', pubkey, privkey % N), f1)
 
 
 def divide(pubkey, privkey):
+    N = current_curve().n
     factor = inv(decode_privkey(privkey), N)
     return multiply(pubkey, factor)
 
@@ -276,6 +1130,7 @@ def compress(pubkey):
     elif f == 'bin': return encode_pubkey(decode_pubkey(pubkey, f), 'bin_compressed')
     elif f == 'hex' or f == 'decimal':
         return encode_pubkey(decode_pubkey(pubkey, f), 'hex_compressed')
+    elif f == 'object': return encode_pubkey(pubkey, 'object_compressed')
 
 
 def decompress(pubkey):
@@ -284,44 +1139,101 @@ def decompress(pubkey):
     elif f == 'bin_compressed': return encode_pubkey(decode_pubkey(pubkey, f), 'bin')
     elif f == 'hex_compressed' or f == 'decimal':
         return encode_pubkey(decode_pubkey(pubkey, f), 'hex')
+    elif f == 'object_compressed': return encode_pubkey(pubkey, 'object')
 
 
 def privkey_to_pubkey(privkey):
+    N = current_curve().n
+    if isinstance(privkey, PrivateKey):
+        if privkey._public_key is None:
+            pub = privkey_to_pubkey(privkey.secret)
+            privkey._public_key = encode_pubkey(pub, get_privkey_format(privkey))
+        return privkey._public_key
     f = get_privkey_format(privkey)
     privkey = decode_privkey(privkey, f)
     if privkey >= N:
         raise Exception("Invalid privkey")
+    pub = _ec_call('privkey_to_point', privkey) if privkey else (0, 0)
     if f in ['bin', 'bin_compressed', 'hex', 'hex_compressed', 'decimal']:
-        return encode_pubkey(fast_multiply(G, privkey), f)
+        return encode_pubkey(pub, f)
     else:
-        return encode_pubkey(fast_multiply(G, privkey), f.replace('wif', 'hex'))
+        return encode_pubkey(pub, f.replace('wif', 'hex'))
 
 privtopub = privkey_to_pubkey
 
 
+def privkeys_to_pubkeys(privkeys, formt=None, chunk_size=256):
+    """
+    Streaming privtopub: yields the pubkey of every private key in order.
+    Each chunk of keys is multiplied in jacobian coordinates and then
+    normalised with one shared inversion. formt forces the output format,
+    otherwise it follows each key's format like privkey_to_pubkey.
+    """
+    N = current_curve().n
+    privkeys = iter(privkeys)
+    while True:
+        chunk = list(itertools.islice(privkeys, chunk_size))
+        if not chunk:
+            return
+        formats, privs = [], []
+        for priv in chunk:
+            f = get_privkey_format(priv)
+            priv = decode_privkey(priv, f)
+            if priv >= N:
+                raise Exception("Invalid privkey")
+            formats.append(formt or f.replace('wif', 'hex'))
+            privs.append(priv)
+        backend = ec_backend()
+        if backend is python_backend:
+            points = batch_from_jacobian([jacobian_base_multiply(k) for k in privs])
+        else:
+            points = [backend.privkey_to_point(k) if k else (0, 0) for k in privs]
+        for pub, f in zip(points, formats):
+            yield encode_pubkey(pub, f)
+
+
 def privkey_to_legacy_address(priv, magicbyte=0):
     return pubkey_to_legacy_address(privkey_to_pubkey(priv), magicbyte)
 privtolegacy = privkey_to_legacy_address
 
 
 def neg_pubkey(pubkey):
+    P = current_curve().p
     f = get_pubkey_format(pubkey)
     pubkey = decode_pubkey(pubkey, f)
     return encode_pubkey((pubkey[0], (P-pubkey[1]) % P), f)
 
 
 def neg_privkey(privkey):
+    N = current_curve().n
     f = get_privkey_format(privkey)
     privkey = decode_privkey(privkey, f)
     return encode_privkey((N - privkey) % N, f)
 
 def subtract_pubkeys(p1, p2):
-    f1, f2 = get_pubkey_format(p1), get_pubkey_format(p2)
-    k2 = decode_pubkey(p2, f2)
-    return encode_pubkey(fast_add(decode_pubkey(p1, f1), (k2[0], (P - k2[1]) % P)), f1)
+    f1 = get_pubkey_format(p1)
+    return (JacobianPoint.from_pubkey(p1) - p2).encode(f1)
+
+
+def pubkey_tweak_add(pubkey, tweak):
+    """
+    Returns pubkey + tweak*G in the format of pubkey, as used by BIP32
+    public derivation and stealth payments
+    """
+    N = current_curve().n
+    if isinstance(pubkey, PrecomputedPoint):
+        pubkey = pubkey.pubkey
+    f = get_pubkey_format(pubkey)
+    pubkey, tweak = decode_pubkey(pubkey, f), decode_privkey(tweak)
+    if tweak >= N:
+        raise Exception("Invalid privkey")
+    if isinf(pubkey) or not tweak:
+        return encode_pubkey(python_backend.tweak_add(pubkey, tweak), f)
+    return encode_pubkey(_ec_call('tweak_add', pubkey, tweak), f)
 
 
 def subtract_privkeys(p1, p2):
+    N = current_curve().n
     f1, f2 = get_privkey_format(p1), get_privkey_format(p2)
     k2 = decode_privkey(p2, f2)
     return encode_privkey((decode_privkey(p1, f1) - k2) % N, f1)
@@ -332,13 +1244,7 @@ def subtract_privkeys(p1, p2):
 
 
 def bin_hash160(string):
-    intermed = hashlib.sha256(string).digest()
-    digest = ''
-    try:
-        digest = hashlib.new('ripemd160', intermed).digest()
-    except:
-        digest = RIPEMD160(intermed).digest()
-    return digest
+    return bin_hash160_digest(string)
 
 def hash160(string):
     return safe_hexlify(bin_hash160(string))
@@ -355,11 +1261,10 @@ def sha256(string):
 
 
 def bin_ripemd160(string):
-    try:
-        digest = hashlib.new('ripemd160', string).digest()
-    except:
-        digest = RIPEMD160(string).digest()
-    return digest
+    if isinstance(string, str):
+        # as the pure Python ripemd module always did: one byte per character
+        string = bytes(ord(c) & 0xff for c in string)
+    return bin_ripemd160_digest(string)
 
 
 def ripemd160(string):
@@ -425,17 +1330,11 @@ def random_electrum_seed():
 # Encodings
 
 def b58check_to_bin(inp):
-    leadingzbytes = len(re.match('^1*', inp).group(0))
-    data = b'\x00' * leadingzbytes + changebase(inp, 58, 256)
-    assert bin_dbl_sha256(data[:-4])[:4] == data[-4:]
-    return data[1:-4]
+    return b58check_decode(inp)[1:]
 
 
 def get_version_byte(inp):
-    leadingzbytes = len(re.match('^1*', inp).group(0))
-    data = b'\x00' * leadingzbytes + changebase(inp, 58, 256)
-    assert bin_dbl_sha256(data[:-4])[:4] == data[-4:]
-    return ord(data[0])
+    return b58check_decode(inp)[0]
 
 
 def hex_to_b58check(inp, magicbyte=0):
@@ -446,7 +1345,9 @@ def b58check_to_hex(inp):
     return safe_hexlify(b58check_to_bin(inp))
 
 def pubkey_to_hash(pubkey):
-    if isinstance(pubkey, (list, tuple)):
+    if isinstance(pubkey, PublicKey):
+        return pubkey.hash160()
+    if isinstance(pubkey, (list, tuple, Point)):
         pubkey = encode_pubkey(pubkey, 'bin')
     if len(pubkey) in [66, 130]:
         return bin_hash160(binascii.unhexlify(pubkey))
@@ -494,32 +1395,113 @@ def decode_sig(sig):
 # https://tools.ietf.org/html/rfc6979#section-3.2
 
 
+# The first HMAC is keyed with zeros and starts with V || 0x00 || priv,
+# so its state only depends on the key: _rfc6979_prefix() computes it once
+# per key (see SigningKey) and each signature copies it.
+
+_RFC6979_ZERO_HMAC = hmac.new(b'\x00' * 32, digestmod=hashlib.sha256)
+
+if hasattr(hmac, 'digest'):
+    def _hmac_sha256(key, msg):
+        return hmac.digest(key, msg, 'sha256')
+else:
+    def _hmac_sha256(key, msg):
+        return hmac.new(key, msg, hashlib.sha256).digest()
+
+
+def _rfc6979_prefix(priv):
+    prefix = _RFC6979_ZERO_HMAC.copy()
+    prefix.update(b'\x01' * 32 + b'\x00' + priv)
+    return prefix
+
+
+def _rfc6979_k(prefix, priv, msghash):
+    # priv and msghash are 32 bytes
+    k = prefix.copy()
+    k.update(msghash)
+    k = k.digest()
+    v = _hmac_sha256(k, b'\x01' * 32)
+    k = _hmac_sha256(k, v+b'\x01'+priv+msghash)
+    v = _hmac_sha256(k, v)
+    return decode(_hmac_sha256(k, v), 256)
+
+
 def deterministic_generate_k(msghash, priv):
-    v = b'\x01' * 32
-    k = b'\x00' * 32
     priv = encode_privkey(priv, 'bin')
     msghash = encode(hash_to_int(msghash), 256, 32)
-    k = hmac.new(k, v+b'\x00'+priv+msghash, hashlib.sha256).digest()
-    v = hmac.new(k, v, hashlib.sha256).digest()
-    k = hmac.new(k, v+b'\x01'+priv+msghash, hashlib.sha256).digest()
-    v = hmac.new(k, v, hashlib.sha256).digest()
-    return decode(hmac.new(k, v, hashlib.sha256).digest(), 256)
+    return _rfc6979_k(_rfc6979_prefix(priv), priv, msghash)
 
 
 def ecdsa_raw_sign(msghash, priv):
-
-    z = hash_to_int(msghash)
-    k = deterministic_generate_k(msghash, priv)
-
-    r, y = fast_multiply(G, k)
-    s = inv(k, N) * (z + r*decode_privkey(priv)) % N
-
-    v, r, s = 27+((y % 2) ^ (0 if s * 2 < N else 1)), r, s if s * 2 < N else N - s
-    if 'compressed' in get_privkey_format(priv):
+    f = get_privkey_format(priv)
+    v, r, s = _ec_call('sign', encode(hash_to_int(msghash), 256, 32), decode_privkey(priv, f))
+    if 'compressed' in f:
         v += 4
     return v, r, s
 
 
+class SigningKey(object):
+    """
+    A private key prepared for signing many hashes: decoded once, with its
+    pubkey, RFC6979 HMAC prefix and native backend key cached. Signatures are the same as
+    ecdsa_raw_sign's. verify sets how signatures are checked against the
+    cached pubkey before being returned: 'always', 'sampled' (a random
+    sample_rate fraction) or 'never'.
+    """
+
+    VERIFY_POLICIES = ('always', 'sampled', 'never')
+
+    def __init__(self, privkey, verify='always', sample_rate=0.01):
+        if verify not in self.VERIFY_POLICIES:
+            raise ValueError("verify must be one of %s" % ', '.join(self.VERIFY_POLICIES))
+        f = get_privkey_format(privkey)
+        self.secret = decode_privkey(privkey, f)
+        if not 0 < self.secret < current_curve().n:
+            raise Exception("Invalid privkey")
+        self.compressed = 'compressed' in f
+        self.verify = verify
+        self.sample_rate = sample_rate
+        self.curve = current_curve()
+        self._format = f
+        self._secret_bytes = encode(self.secret, 256, 32)
+        self._prefix = _rfc6979_prefix(self._secret_bytes)
+        self._pubkey = None
+        self._point = None
+        self._prepared = {}
+        self._random = random.SystemRandom()
+
+    @property
+    def pubkey(self):
+        """privtopub of the key, in the format privtopub would return"""
+        if self._pubkey is None:
+            self._pubkey = self.curve.run(privkey_to_pubkey, encode_privkey(self.secret, self._format))
+        return self._pubkey
+
+    def _public_point(self):
+        if self._point is None:
+            self._point = self.curve.run(decode_pubkey, self.pubkey)
+        return self._point
+
+    def sign(self, msghash):
+        with use_curve(self.curve):
+            msghash = encode(hash_to_int(msghash), 256, 32)
+            backend = ec_backend()
+            if backend is python_backend:
+                vrs = _py_sign(msghash, self.secret, _rfc6979_k(self._prefix, self._secret_bytes, msghash))
+            else:
+                if backend.name not in self._prepared:
+                    self._prepared[backend.name] = backend.prepare_key(self.secret)
+                vrs = backend.sign(msghash, self._prepared[backend.name])
+            if self.verify == 'always' or (self.verify == 'sampled' and self._random.random() < self.sample_rate):
+                if not ecdsa_raw_verify(msghash, vrs, self._public_point()):
+                    raise Exception("Bad Sig!\t v = %d\n,r = %d\ns = %d" % vrs)
+        v, r, s = vrs
+        return (v + 4 if self.compressed else v), r, s
+
+    def sign_many(self, hashes):
+        return [self.sign(msghash) for msghash in hashes]
+
+
 def ecdsa_sign(msg, priv, coin):
     v, r, s = ecdsa_raw_sign(electrum_sig_hash(msg), priv)
     sig = encode_sig(v, r, s)
@@ -528,15 +1510,63 @@ def ecdsa_sign(msg, priv, coin):
     return sig
 
 
-def ecdsa_raw_verify(msghash, vrs, pub):
-    v, r, s = vrs
+def _ecdsa_verify_point(z, r, s, w, Q):
+    curve = current_curve()
+    P, N, G = curve.p, curve.n, curve.g
+    if not (r % N) or not (s % N):
+        return False
+    X, Y, Z = jacobian_shamir(to_jacobian(G), z*w % N, to_jacobian(Q), r*w % N)
+    # compare r with X / Z**2 without leaving jacobian coordinates
+    return bool(Z and r < P and (r * Z * Z - X) % P == 0)
 
-    w = inv(s, N)
-    z = hash_to_int(msghash)
 
-    u1, u2 = z*w % N, r*w % N
-    x, y = fast_add(fast_multiply(G, u1), fast_multiply(decode_pubkey(pub), u2))
-    return bool(r == x and (r % N) and (s % N))
+def ecdsa_raw_verify(msghash, vrs, pub):
+    N = current_curve().n
+    v, r, s = vrs
+    pub = decode_pubkey(pub)
+    if 0 < r < N and 0 < s < N and not isinf(pub):
+        return _ec_call('verify', encode(hash_to_int(msghash), 256, 32), r, s, pub)
+    return _ecdsa_verify_point(hash_to_int(msghash), r, s, inv(s, N), pub)
+
+
+def _ecdsa_randomized_check(prepared):
+    curve = current_curve()
+    P, N, G = curve.p, curve.n, curve.g
+    # sum(a_i * (u1_i*G + u2_i*Q_i - R_i)) == O for random 128-bit a_i;
+    # needs the recovery byte of every signature to rebuild R_i
+    rand = random.SystemRandom()
+    g, terms = 0, []
+    for z, (v, r, s), Q, w in prepared:
+        R = v is not None and recover_r_point(v, r)
+        if not R or not (s % N):
+            return False
+        a = rand.getrandbits(128) | 1
+        g += a * z * w
+        terms += _scalar_terms(to_jacobian(Q), a * r * w)
+        terms += _scalar_terms((R[0], P - R[1], 1), a)
+    terms += _scalar_terms(to_jacobian(G), g)
+    return not terms or not _jacobian_interleave(terms)[1]
+
+
+def ecdsa_batch_verify(items, all_valid=False):
+    """
+    Verify many (msghash, vrs, pub) triples; returns a list of booleans,
+    or a single boolean telling if all of them are valid when all_valid is
+    set. The all-valid answer is first tried as one randomized linear
+    combination and only falls back to per-item checks if that fails.
+    """
+    N = current_curve().n
+    items = list(items)
+    if ec_backend() is not python_backend:
+        results = [ecdsa_raw_verify(*item) for item in items]
+        return all(results) if all_valid else results
+    ws = batch_inv([vrs[2] for msghash, vrs, pub in items], N)
+    prepared = [(hash_to_int(msghash), vrs, decode_pubkey(pub), w)
+                for (msghash, vrs, pub), w in zip(items, ws)]
+    if all_valid and _ecdsa_randomized_check(prepared):
+        return True
+    results = [_ecdsa_verify_point(z, vrs[1], vrs[2], w, Q) for z, vrs, Q, w in prepared]
+    return all(results) if all_valid else results
 
 
 # For BitcoinCore, (msg = addr or msg = "") be default
@@ -553,33 +1583,203 @@ def ecdsa_verify(msg, sig, pub, coin):
     return ecdsa_raw_verify(electrum_sig_hash(msg), decode_sig(sig), pub)
 
 
-def ecdsa_raw_recover(msghash, vrs):
-    v, r, s = vrs
+def recover_r_point(v, r):
+    curve = current_curve()
+    P, N, A, B = curve.p, curve.n, curve.a, curve.b
     x = r
     xcubedaxb = (x*x*x+A*x+B) % P
-    beta = pow(xcubedaxb, (P+1)//4, P)
+    beta = pow(xcubedaxb, curve.sqrt_exp, P)
     y = beta if v % 2 ^ beta % 2 else (P - beta)
     # If xcubedaxb is not a quadratic residue, then r cannot be the x coord
     # for a point on the curve, and so the sig is invalid
-    if (xcubedaxb - y*y) % P != 0 or not (r % N) or not (s % N):
+    if (xcubedaxb - y*y) % P != 0 or not (r % N):
+        return False
+    return (x, y)
+
+
+def ecdsa_raw_recover(msghash, vrs):
+    N = current_curve().n
+    v, r, s = vrs
+    if 0 < r < N and 0 < s < N:
+        return _ec_call('recover', encode(hash_to_int(msghash), 256, 32), (v + 1) % 2, r, s)
+    return _py_ecdsa_raw_recover(msghash, vrs)
+
+
+def _py_ecdsa_raw_recover(msghash, vrs):
+    curve = current_curve()
+    N, G = curve.n, curve.g
+    v, r, s = vrs
+    R = recover_r_point(v, r)
+    if not R or not (s % N):
         return False
     z = hash_to_int(msghash)
-    Gz = jacobian_multiply((Gx, Gy, 1), (N - z) % N)
-    XY = jacobian_multiply((x, y, 1), s)
-    Qr = jacobian_add(Gz, XY)
-    Q = jacobian_multiply(Qr, inv(r, N))
-    Q = from_jacobian(Q)
+    rinv = inv(r, N)
+    # Q = r^-1 * (s*R - z*G)
+    Q = from_jacobian(jacobian_shamir(to_jacobian(G), -z * rinv, to_jacobian(R), s * rinv))
 
     # if ecdsa_raw_verify(msghash, vrs, Q):
     return Q
     # return False
 
 
+def _py_sign(msghash, priv, k):
+    N = current_curve().n
+    z = hash_to_int(msghash)
+
+    r, y = fast_base_multiply(k)
+    s = inv(k, N) * (z + r*priv) % N
+
+    return 27+((y % 2) ^ (0 if s * 2 < N else 1)), r, s if s * 2 < N else N - s
+
+
+class PythonBackend(ECBackend):
+    """The pure Python arithmetic of this module, works on any curve"""
+
+    name = 'python'
+
+    def privkey_to_point(self, priv):
+        return fast_base_multiply(priv)
+
+    def sign(self, msghash, priv):
+        return _py_sign(msghash, priv, deterministic_generate_k(msghash, priv))
+
+    def verify(self, msghash, r, s, pub):
+        N = current_curve().n
+        return _ecdsa_verify_point(hash_to_int(msghash), r, s, inv(s, N), pub)
+
+    def recover(self, msghash, recid, r, s):
+        return _py_ecdsa_raw_recover(msghash, (27 + recid, r, s))
+
+    def tweak_add(self, pub, tweak):
+        return JacobianPoint.from_pubkey(pub).tweak_add(tweak).to_affine()
+
+    def multiply(self, pub, priv):
+        return fast_multiply(pub, priv)
+
+
+python_backend = PythonBackend()
+register_backend(python_backend)
+
+
+def ec_backend():
+    """
+    The active EC backend, or the python one when the active backend does
+    not implement the current curve (see use_curve and change_curve)
+    """
+    backend = get_backend()
+    if backend.curve is not None and current_curve() != SECP256K1:
+        return python_backend
+    return backend
+
+
+def _ec_call(method, *args):
+    backend = ec_backend()
+    try:
+        return getattr(backend, method)(*args)
+    except (ValueError, OverflowError):
+        # Native backends reject inputs the python code tolerates
+        # (negative or out of range keys...), keep the historical behaviour for those
+        if backend is python_backend:
+            raise
+        return getattr(python_backend, method)(*args)
+
+
 def ecdsa_recover(msg, sig):
     v,r,s = decode_sig(sig)
     Q = ecdsa_raw_recover(electrum_sig_hash(msg), (v,r,s))
     return encode_pubkey(Q, 'hex_compressed') if v >= 31 else encode_pubkey(Q, 'hex')
 
+# Signed messages in bulk: each distinct message is hashed once, the r
+# inversions and the final jacobian to affine conversions share one
+# modular inversion for the whole batch. The header byte tells which
+# address the key stands for (BIP137): 27-30 P2PKH of the uncompressed
+# key, 31-34 P2PKH of the compressed key, 35-38 P2SH-P2WPKH and 39-42
+# P2WPKH, so only that one address form is derived per signature.
+
+
+def _decode_sigs(sigs):
+    out = []
+    for sig in sigs:
+        try:
+            bytez = base64.b64decode(sig)
+        except (TypeError, ValueError):
+            bytez = b''
+        if len(bytez) != 65:
+            out.append(None)
+        else:
+            out.append((bytez[0], decode(bytez[1:33], 256), decode(bytez[33:], 256)))
+    return out
+
+
+def _recover_many(msgs, sigs):
+    # (v, Q) per signature, Q is None when the signature does not recover
+    N = current_curve().n
+    hashes = {}
+    for m in msgs:
+        if m not in hashes:
+            hashes[m] = electrum_sig_hash(m)
+    msghashes = [hashes[m] for m in msgs]
+    vrss = _decode_sigs(sigs)
+    if ec_backend() is not python_backend:
+        return [(vrs[0], ecdsa_raw_recover(h, vrs) or None) if vrs else (None, None)
+                for h, vrs in zip(msghashes, vrss)]
+    G = to_jacobian(getG())
+    rinvs = batch_inv([vrs[1] if vrs else 0 for vrs in vrss], N)
+    points, jacobians = [], []
+    for h, vrs, rinv in zip(msghashes, vrss, rinvs):
+        R = vrs and rinv and recover_r_point(vrs[0], vrs[1])
+        if not R or not (vrs[2] % N):
+            points.append((vrs and vrs[0], None))
+            continue
+        z = hash_to_int(h)
+        points.append((vrs[0], len(jacobians)))
+        jacobians.append(jacobian_shamir(G, -z * rinv, to_jacobian(R), vrs[2] * rinv))
+    affine = batch_from_jacobian(jacobians)
+    return [(v, None if i is None else affine[i]) for v, i in points]
+
+
+def ecdsa_recover_many(items):
+    """
+    ecdsa_recover() over (msg, sig) pairs; returns the hex pubkeys, or
+    False for signatures that do not decode or recover
+    """
+    items = list(items)
+    out = []
+    for v, Q in _recover_many([m for m, sig in items], [sig for m, sig in items]):
+        if Q is None:
+            out.append(False)
+        else:
+            out.append(encode_pubkey(Q, 'hex_compressed') if v >= 31 else encode_pubkey(Q, 'hex'))
+    return out
+
+
+def _message_address_match(addr, v, pubkey_hash, magicbyte, script_magicbyte, segwit_hrp):
+    if 27 <= v < 35:
+        return addr == bin_to_b58check(pubkey_hash, magicbyte)
+    if 35 <= v < 39:
+        return addr == bin_to_b58check(bin_hash160(b'\x00\x14' + pubkey_hash), script_magicbyte)
+    if 39 <= v < 43:
+        return segwit_addr.decode(segwit_hrp, addr) == (0, list(pubkey_hash))
+    return False
+
+
+def ecdsa_verify_addr_many(items, magicbyte=0, script_magicbyte=5, segwit_hrp='bc'):
+    """
+    Verify many (msg, sig, addr) signed messages, returns a list of
+    booleans. Addresses must be of the network given by magicbyte (P2PKH),
+    script_magicbyte (P2SH-P2WPKH) and segwit_hrp (P2WPKH), Bitcoin
+    mainnet by default.
+    """
+    items = list(items)
+    recovered = _recover_many([m for m, sig, addr in items], [sig for m, sig, addr in items])
+    out = []
+    for (msg, sig, addr), (v, Q) in zip(items, recovered):
+        if Q is None:
+            out.append(False)
+            continue
+        pubkey_hash = bin_hash160(encode_pubkey(Q, 'bin_compressed' if v >= 31 else 'bin'))
+        out.append(_message_address_match(addr, v, pubkey_hash, magicbyte, script_magicbyte, segwit_hrp))
+    return out
 
 
 # add/subtract 
@@ -1,6 +1,7 @@
 import sys, os
 import binascii
 import hashlib
+from .b58 import b58check_encode
 
 
 if sys.version_info.major == 3:
@@ -43,15 +44,7 @@ if sys.version_info.major == 3:
         while magicbyte > 0:
             inp = from_int_to_byte(magicbyte % 256) + inp
             magicbyte //= 256
-
-        leadingzbytes = 0
-        for x in inp:
-            if x != 0:
-                break
-            leadingzbytes += 1
-
-        checksum = bin_dbl_sha256(inp)[:4]
-        return '1' * leadingzbytes + changebase(inp+checksum, 256, 58)
+        return b58check_encode(inp)
 
     def bytes_to_hex_string(b):
         if isinstance(b, str):
@@ -77,47 +70,78 @@ if sys.version_info.major == 3:
     def safe_hexlify(a):
         return str(binascii.hexlify(a), 'utf-8')
 
-    def encode(val, base, minlen=0):
-        base, minlen = int(base), int(minlen)
-        code_string = get_code_string(base)
-        result_bytes = bytes()
-        while val > 0:
-            curcode = code_string[val % base]
-            result_bytes = bytes([ord(curcode)]) + result_bytes
-            val //= base
+    # encode/decode work on whole integers where Python has a native
+    # conversion (bytes, hex) and on chunks of digits that fit a machine
+    # word otherwise, so both stay linear in the length of the input
+
+    _padding_elements = {256: b'\x00', 58: '1'}
+    _chunk_digits = {2: 60, 10: 18, 16: 15, 32: 12, 58: 10}
+    _digit_tables = {}
 
-        pad_size = minlen - len(result_bytes)
+    def _digit_table(base):
+        if base not in _digit_tables:
+            table = {}
+            for i, c in enumerate(get_code_string(base)):
+                table.setdefault(c, i)
+                table.setdefault(ord(c), i)
+            _digit_tables[base] = table
+        return _digit_tables[base]
 
-        padding_element = b'\x00' if base == 256 else b'1' \
-            if base == 58 else b'0'
-        if (pad_size > 0):
-            result_bytes = padding_element*pad_size + result_bytes
+    def _encode_digits(val, base):
+        code_string = get_code_string(base)
+        size = _chunk_digits[base]
+        chunk_base = base ** size
+        chunks = []
+        while val > 0:
+            val, chunk = divmod(val, chunk_base)
+            digits = []
+            for i in range(size):
+                chunk, d = divmod(chunk, base)
+                digits.append(code_string[d])
+            chunks.append(''.join(reversed(digits)))
+        return ''.join(reversed(chunks)).lstrip(code_string[0])
 
-        result_string = ''.join([chr(y) for y in result_bytes])
-        result = result_bytes if base == 256 else result_string
+    def encode(val, base, minlen=0):
+        base, minlen = int(base), int(minlen)
+        get_code_string(base)
+        if val <= 0:
+            result = b'' if base == 256 else ''
+        elif base == 256:
+            result = val.to_bytes((val.bit_length() + 7) // 8, 'big')
+        elif base == 16:
+            result = '%x' % val
+        else:
+            result = _encode_digits(val, base)
+        return result.rjust(minlen, _padding_elements.get(base, '0'))
 
+    def _decode_digits(string, base):
+        table = _digit_table(base)
+        size = _chunk_digits[base]
+        result = 0
+        for i in range(0, len(string), size):
+            chunk = string[i:i+size]
+            value = 0
+            for d in chunk:
+                value = value * base + table.get(d, -1)
+            result = result * base ** len(chunk) + value
         return result
 
     def decode(string, base):
         if base == 256 and isinstance(string, str):
             string = bytes(bytearray.fromhex(string))
         base = int(base)
-        code_string = get_code_string(base)
-        result = 0
+        get_code_string(base)
         if base == 256:
-            def extract(d, cs):
-                return d
-        else:
-            def extract(d, cs):
-                return cs.find(d if isinstance(d, str) else chr(d))
-
+            return int.from_bytes(string, 'big')
         if base == 16:
             string = string.lower()
-        while len(string) > 0:
-            result *= base
-            result += extract(string[0], code_string)
-            string = string[1:]
-        return result
+            if len(string) % 2:
+                string = ('0' if isinstance(string, str) else b'0') + string
+            try:
+                return int.from_bytes(binascii.unhexlify(string), 'big')
+            except ValueError:
+                pass
+        return _decode_digits(string, base)
 
     def random_string(x):
         return str(os.urandom(x))
@@ -17,12 +17,12 @@ def shared_secret_receiver(ephem_pubkey, scan_privkey):
 
 def uncover_pay_pubkey_sender(scan_pubkey, spend_pubkey, ephem_privkey):
     shared_secret = shared_secret_sender(scan_pubkey, ephem_privkey)
-    return main.add_pubkeys(spend_pubkey, main.privtopub(shared_secret))
+    return main.pubkey_tweak_add(spend_pubkey, shared_secret)
 
 
 def uncover_pay_pubkey_receiver(scan_privkey, spend_pubkey, ephem_pubkey):
     shared_secret = shared_secret_receiver(ephem_pubkey, scan_privkey)
-    return main.add_pubkeys(spend_pubkey, main.privtopub(shared_secret))
+    return main.pubkey_tweak_add(spend_pubkey, shared_secret)
 
 
 def uncover_pay_privkey(scan_privkey, spend_privkey, ephem_pubkey):
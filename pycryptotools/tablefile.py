@@ -0,0 +1,115 @@
+import hashlib
+import mmap
+import os
+import struct
+
+__all__ = ['TABLE_MAGIC', 'TABLE_VERSION', 'curve_digest', 'write_table', 'MappedTable', 'load_table']
+
+# Binary files for fixed-base tables (see main.save_generator_table)
+#
+# header: magic, format version, window, row count, row width and the
+# sha256 of the curve parameters, then every point as 32 byte big endian
+# x and y, then the sha256 of everything before it. Files are mapped
+# read-only, so forked workers share one page cache copy, and points are
+# decoded on lookup.
+
+TABLE_MAGIC = b'PCTFBTBL'
+TABLE_VERSION = 1
+_HEADER = struct.Struct('>8sHBxIH32s')
+_COORD = 32
+
+
+def curve_digest(params):
+    return hashlib.sha256(repr(params).encode()).digest()
+
+
+def write_table(path, rows, window, params):
+    width = len(rows[0])
+    body = bytearray(_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, window, len(rows), width, curve_digest(params)))
+    for row in rows:
+        for point in row:
+            body += point[0].to_bytes(_COORD, 'big') + point[1].to_bytes(_COORD, 'big')
+    body += hashlib.sha256(body).digest()
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+class _MappedRow(object):
+    __slots__ = ('view', 'offset')
+
+    def __init__(self, view, offset):
+        self.view = view
+        self.offset = offset
+
+    def __getitem__(self, d):
+        off = self.offset + d * 2 * _COORD
+        view = self.view
+        return (int.from_bytes(view[off:off+_COORD], 'big'),
+                int.from_bytes(view[off+_COORD:off+2*_COORD], 'big'), 1)
+
+
+class MappedTable(object):
+    """Read-only table[i][d] -> (x, y, 1) view over a mapped table file"""
+
+    def __init__(self, mapping, window, rows, width):
+        self.mapping = mapping
+        self.window = window
+        self.width = width
+        self.view = view = memoryview(mapping)
+        stride = width * 2 * _COORD
+        self.rows = [_MappedRow(view, _HEADER.size + i * stride) for i in range(rows)]
+
+    def __getitem__(self, i):
+        return self.rows[i]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def close(self):
+        self.rows = []
+        self.view.release()
+        self.mapping.close()
+
+
+def load_table(path, params, window=None):
+    """
+    Maps a table file, or returns None when it is missing, for another
+    curve or window, from another format version or corrupted
+    """
+    try:
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapping) < _HEADER.size + 32:
+        return None
+    magic, version, w, rows, width, digest = _HEADER.unpack_from(mapping, 0)
+    if (magic != TABLE_MAGIC or version != TABLE_VERSION or digest != curve_digest(params)
+            or (window is not None and w != window) or width != 2**w - 1
+            or len(mapping) != _HEADER.size + rows * width * 2 * _COORD + 32
+            or not _checksum_ok(mapping)):
+        mapping.close()
+        return None
+    table = MappedTable(mapping, w, rows, width)
+    if not rows or not _starts_with_generator(table, params):
+        table.close()
+        return None
+    return table
+
+
+def _checksum_ok(mapping):
+    # hashed in place, slicing the mmap would copy the whole file
+    view = memoryview(mapping)
+    try:
+        return hashlib.sha256(view[:-32]).digest() == view[-32:]
+    finally:
+        view.release()
+
+
+def _starts_with_generator(table, params):
+    # the digest only covers the parameters, the points must match them too
+    p, n, a, b, g = params
+    x, y, z = table[0][0]
+    return (x, y) == tuple(g) and (y * y - x * x * x - a * x - b) % p == 0
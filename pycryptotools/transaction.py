@@ -1,5 +1,5 @@
 #!/usr/bin/python
-import binascii, re, copy
+import binascii, hashlib, re, struct
 from .main import *
 from _functools import reduce
 
@@ -71,72 +71,196 @@ def is_segwit(tx):
 
 def deserialize(tx):
     if isinstance(tx, str) and re.match('^[0-9a-fA-F]*$', tx):
-        # tx = bytes(bytearray.fromhex(tx))
-        return json_changebase(deserialize(binascii.unhexlify(tx)),
-                               lambda x: safe_hexlify(x))
-    # http://stackoverflow.com/questions/4851463/python-closure-write-to-variable-in-parent-scope
-    # Python's scoping rules are demented, requiring me to make pos an object
-    # so that it is call-by-reference
-    pos = [0]
-
-    def read_as_int(bytez):
-        pos[0] += bytez
-        return decode(tx[pos[0] - bytez:pos[0]][::-1], 256)
-
-    def read_var_int():
-        pos[0] += 1
-        val = from_byte_to_int(tx[pos[0] - 1])
-        if val < 253:
-            return val
-        return read_as_int(pow(2, val - 252))
-
-    def read_bytes(bytez):
-        pos[0] += bytez
-        return tx[pos[0] - bytez:pos[0]]
-
-    def read_var_string():
-        size = read_var_int()
-        return read_bytes(size)
-
-    def read_segwit_string():
-        size = read_var_int()
-        return num_to_var_int(size)+read_bytes(size)
-
-    obj = {"ins": [], "outs": []}
-    obj["version"] = read_as_int(4)
-    has_witness = is_segwit(tx)
-    if has_witness:
-        obj['marker'] = read_as_int(1)
-        obj['flag'] = read_as_int(1)
-    ins = read_var_int()
-    for i in range(ins):
-        obj["ins"].append({
-            "outpoint": {
-                "hash": read_bytes(32)[::-1],
-                "index": read_as_int(4)
-            },
-            "script": read_var_string(),
-            "sequence": read_as_int(4)
-        })
-    outs = read_var_int()
-    for i in range(outs):
-        obj["outs"].append({
-            "value": read_as_int(8),
-            "script": read_var_string()
-        })
-    if has_witness:
-        obj['witness'] = []
-        for i in range(ins):
-            number = read_var_int()
-            scriptCode = []
-            for i in range(number):
-                scriptCode.append(read_segwit_string())
-            obj['witness'].append({
-                'number': number,
-                'scriptCode': list_to_bytes(scriptCode)
+        return parse_tx(tx).to_dict(hexlify=True)
+    return parse_tx(tx).to_dict()
+
+
+# Lazy deserialization
+#
+# parse_tx() walks a raw transaction once, over a memoryview, and only
+# records where each field starts. Scripts, witnesses and outpoint hashes
+# are copied out of the buffer when asked for; integers are unpacked in
+# place. deserialize() is parse_tx(tx).to_dict().
+
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+
+def _read_var_int(view, pos):
+    n = view[pos]
+    if n < 0xfd:
+        return n, pos + 1
+    if n == 0xfd:
+        return _U16.unpack_from(view, pos + 1)[0], pos + 3
+    if n == 0xfe:
+        return _U32.unpack_from(view, pos + 1)[0], pos + 5
+    return _U64.unpack_from(view, pos + 1)[0], pos + 9
+
+
+class ParsedTx(object):
+    """
+    A transaction parsed in place from raw[start:end]. ins holds an
+    (outpoint, script start, script end) offset triple per input, the
+    sequence follows the script; outs holds (value, script start, script
+    end); witness holds (start, end, number of items) per input, or is None
+    for legacy transactions. raw must not change while the ParsedTx is used.
+    """
+
+    __slots__ = ('raw', 'start', 'end', 'version', 'locktime', 'segwit', 'ins', 'outs', 'witness', '_body')
+
+    def outpoint(self, i):
+        """(txid, index) spent by input i, the txid in the usual reversed byte order"""
+        o = self.ins[i][0]
+        return bytes(self.raw[o:o + 32])[::-1], _U32.unpack_from(self.raw, o + 32)[0]
+
+    def outpoints(self):
+        return [self.outpoint(i) for i in range(len(self.ins))]
+
+    def input_script(self, i):
+        o, start, end = self.ins[i]
+        return bytes(self.raw[start:end])
+
+    def sequence(self, i):
+        return _U32.unpack_from(self.raw, self.ins[i][2])[0]
+
+    def output_value(self, i):
+        return _U64.unpack_from(self.raw, self.outs[i][0])[0]
+
+    def output_script(self, i):
+        o, start, end = self.outs[i]
+        return bytes(self.raw[start:end])
+
+    def output_scripts(self):
+        raw = self.raw
+        return [bytes(raw[start:end]) for o, start, end in self.outs]
+
+    def witness_items(self, i):
+        if self.witness is None:
+            return []
+        raw = self.raw
+        pos, end, number = self.witness[i]
+        items = []
+        for _ in range(number):
+            size, pos = _read_var_int(raw, pos)
+            items.append(bytes(raw[pos:pos + size]))
+            pos += size
+        return items
+
+    def tobytes(self):
+        return bytes(self.raw[self.start:self.end])
+
+    def txid(self):
+        """Hex txid, the hash of the transaction without its witness"""
+        raw = self.raw
+        h = hashlib.sha256()
+        if self.segwit:
+            body, body_end = self._body
+            h.update(raw[self.start:self.start + 4])
+            h.update(raw[body:body_end])
+            h.update(raw[self.end - 4:self.end])
+        else:
+            h.update(raw[self.start:self.end])
+        return safe_hexlify(hashlib.sha256(h.digest()).digest()[::-1])
+
+    def to_dict(self, hexlify=False):
+        """The deserialize() dict, with hex strings for hexlify=True"""
+        raw = self.raw
+        u32 = _U32.unpack_from
+        u64 = _U64.unpack_from
+        out = (lambda b: b.hex()) if hexlify else bytes
+        ins = []
+        for o, start, end in self.ins:
+            ins.append({
+                "outpoint": {
+                    "hash": out(bytes(raw[o:o + 32])[::-1]),
+                    "index": u32(raw, o + 32)[0]
+                },
+                "script": out(raw[start:end]),
+                "sequence": u32(raw, end)[0]
             })
-    obj["locktime"] = read_as_int(4)
-    return obj
+        outs = [{"value": u64(raw, o)[0], "script": out(raw[start:end])} for o, start, end in self.outs]
+        obj = {"ins": ins, "outs": outs, "version": self.version}
+        if self.segwit:
+            obj['marker'] = 0
+            obj['flag'] = raw[self.start + 5]
+            obj['witness'] = [{'number': number, 'scriptCode': out(raw[start:end])}
+                              for start, end, number in self.witness]
+        obj["locktime"] = self.locktime
+        return obj
+
+
+def _parse_tx(view, pos):
+    tx = ParsedTx()
+    tx.raw = view
+    tx.start = pos
+    tx.version = _U32.unpack_from(view, pos)[0]
+    pos += 4
+    tx.segwit = segwit = view[pos] == 0
+    if segwit:
+        pos += 2
+    body = pos
+    n, pos = _read_var_int(view, pos)
+    ins = []
+    for _ in range(n):
+        size, script = _read_var_int(view, pos + 36)
+        ins.append((pos, script, script + size))
+        pos = script + size + 4
+    n, pos = _read_var_int(view, pos)
+    outs = []
+    for _ in range(n):
+        size, script = _read_var_int(view, pos + 8)
+        outs.append((pos, script, script + size))
+        pos = script + size
+    tx._body = (body, pos)
+    witness = None
+    if segwit:
+        witness = []
+        for _ in range(len(ins)):
+            number, pos = _read_var_int(view, pos)
+            start = pos
+            for _ in range(number):
+                size, pos = _read_var_int(view, pos)
+                pos += size
+            witness.append((start, pos, number))
+    tx.ins, tx.outs, tx.witness = ins, outs, witness
+    tx.locktime = _U32.unpack_from(view, pos)[0]
+    tx.end = pos + 4
+    return tx
+
+
+def parse_tx(raw, pos=0):
+    """
+    Parses the transaction starting at raw[pos] (bytes, bytearray,
+    memoryview or hex) without copying it. Raises ValueError if raw ends
+    before the transaction does.
+    """
+    if isinstance(raw, str):
+        raw = binascii.unhexlify(raw)
+    try:
+        return _parse_tx(memoryview(raw), pos)
+    except (IndexError, struct.error):
+        raise ValueError("Truncated transaction")
+
+
+def parse_many(stream):
+    """
+    Yields a ParsedTx per transaction of stream: either one buffer of
+    back to back raw transactions (e.g. a block after its transaction count)
+    or an iterable of raw transactions.
+    """
+    if isinstance(stream, str):
+        stream = binascii.unhexlify(stream)
+    if isinstance(stream, (bytes, bytearray, memoryview)):
+        view = memoryview(stream)
+        pos = 0
+        while pos < len(view):
+            tx = parse_tx(view, pos)
+            pos = tx.end
+            yield tx
+    else:
+        for raw in stream:
+            yield parse_tx(raw)
 
 def serialize(txobj, include_witness=True):
     if isinstance(txobj, bytes):
@@ -167,66 +291,119 @@ def serialize(txobj, include_witness=True):
     return list_to_bytes(o)
 
 # https://github.com/Bitcoin-UAHF/spec/blob/master/replay-protected-sighash.md#OP_CHECKSIG
+# (the BIP143 digest, also used for segwit inputs)
 def uahf_digest(txobj, i):
-    if isinstance(txobj, bytes):
-        txobj = bytes_to_hex_string(txobj)
-    o = []
-
-    if json_is_base(txobj, 16):
-        txobj = json_changebase(txobj, lambda x: binascii.unhexlify(x))
-    o.append(encode(txobj["version"], 256, 4)[::-1])
-
-    serialized_ins = []
-    for inp in txobj["ins"]:
-        serialized_ins.append(inp["outpoint"]["hash"][::-1])
-        serialized_ins.append(encode_4_bytes(inp["outpoint"]["index"]))
-    inputs_hashed = dbl_sha256_list(serialized_ins)
-    o.append(inputs_hashed)
-
-    sequences = dbl_sha256_list([encode_4_bytes(inp["sequence"]) for inp in txobj['ins']])
-    o.append(sequences)
-
-    inp = txobj['ins'][i]
-    o.append(inp["outpoint"]["hash"][::-1])
-    o.append(encode_4_bytes(inp["outpoint"]["index"]))
-    o.append(num_to_var_int(len(inp["script"])) + (inp["script"] if inp["script"] or is_python2 else bytes()))
-    o.append(encode_8_bytes(inp['amount']))
-    o.append(encode_4_bytes(inp['sequence']))
-
-    serialized_outs = []
-    for out in txobj["outs"]:
-        serialized_outs.append(encode_8_bytes(out["value"]))
-        serialized_outs.append(num_to_var_int(len(out["script"])) + out["script"])
-    outputs_hashed = dbl_sha256_list(serialized_outs)
-    o.append(outputs_hashed)
+    return SighashCache(txobj).preimage(i, None)
 
-    o.append(encode_4_bytes(txobj["locktime"]))
 
-    return list_to_bytes(o)
+class SighashCache(object):
+    """
+    The parts of the BIP143 / SIGHASH_FORKID preimage shared by all the
+    inputs of a transaction: hashPrevouts, hashSequence and hashOutputs are
+    computed once, on first use, instead of once per signed input. Build
+    one per transaction and pass it to signature_form, multisign or
+    verify_tx_input for each input (multisign_inputs does this); the
+    transaction must not change while the cache is in use. Inputs need
+    their 'amount'.
+    """
 
-def signature_form(tx, i, script, hashcode=SIGHASH_ALL):
+    def __init__(self, tx):
+        if isinstance(tx, string_or_bytes_types):
+            tx = deserialize(tx)
+        if json_is_base(tx, 16):
+            tx = json_changebase(tx, lambda x: binascii.unhexlify(x))
+        self.tx = tx
+        self.outpoints = [inp["outpoint"]["hash"][::-1] + encode_4_bytes(inp["outpoint"]["index"])
+                          for inp in tx["ins"]]
+        self._hash_prevouts = None
+        self._hash_sequence = None
+        self._hash_outputs = None
+
+    def hash_prevouts(self):
+        if self._hash_prevouts is None:
+            self._hash_prevouts = bin_dbl_sha256(b''.join(self.outpoints))
+        return self._hash_prevouts
+
+    def hash_sequence(self):
+        if self._hash_sequence is None:
+            self._hash_sequence = bin_dbl_sha256(b''.join(encode_4_bytes(inp["sequence"]) for inp in self.tx["ins"]))
+        return self._hash_sequence
+
+    def hash_outputs(self):
+        if self._hash_outputs is None:
+            self._hash_outputs = bin_dbl_sha256(b''.join(
+                encode_8_bytes(out["value"]) + num_to_var_int(len(out["script"])) + out["script"]
+                for out in self.tx["outs"]))
+        return self._hash_outputs
+
+    def preimage(self, i, script):
+        """What uahf_digest returns for input i once its script is set to script (None keeps it)"""
+        inp = self.tx["ins"][i]
+        if script is None:
+            script = inp["script"]
+        elif isinstance(script, str):
+            script = binascii.unhexlify(script)
+        return b''.join([
+            encode_4_bytes(self.tx["version"]),
+            self.hash_prevouts(),
+            self.hash_sequence(),
+            self.outpoints[i],
+            num_to_var_int(len(script)) + script,
+            encode_8_bytes(inp["amount"]),
+            encode_4_bytes(inp["sequence"]),
+            self.hash_outputs(),
+            encode_4_bytes(self.tx["locktime"]),
+        ])
+
+
+def signature_form(tx, i, script, hashcode=SIGHASH_ALL, cache=None):
     i, hashcode = int(i), int(hashcode)
-    if isinstance(tx, string_or_bytes_types):
+    if cache is None and isinstance(tx, string_or_bytes_types):
         tx = deserialize(tx)
-    is_segwit = tx['ins'][i].get('segwit', False) or tx['ins'][i].get('new_segwit', False)
-    newtx = copy.deepcopy(tx)
-    for inp in newtx["ins"]:
-        inp["script"] = ""
-    newtx["ins"][i]["script"] = script
+    inp = (tx if cache is None else cache.tx)['ins'][i]
+    is_segwit = inp.get('segwit', False) or inp.get('new_segwit', False)
     if is_segwit or hashcode & 255 == SIGHASH_ALL + SIGHASH_FORKID:
-        return uahf_digest(newtx, i)
-    elif hashcode == SIGHASH_NONE:
-        newtx["outs"] = []
+        return (cache or SighashCache(tx)).preimage(i, script)
+    if isinstance(tx, string_or_bytes_types):
+        tx = deserialize(tx)
+    return legacy_signature_form(tx, i, script, hashcode)
+
+
+def legacy_signature_form(txobj, i, script, hashcode=SIGHASH_ALL):
+    """
+    Pre-segwit signature form of input i, written straight from txobj:
+    every input script is blanked but the one of input i, replaced by
+    script, and the outputs and inputs follow the hashcode. Hex in, hex
+    out; binary in, binary out.
+    """
+    ins, outs = txobj["ins"], txobj["outs"]
+    hexed = isinstance(ins[i]["outpoint"]["hash"], str)
+    unhex = binascii.unhexlify if hexed else bytes
+    if isinstance(script, str):
+        script = binascii.unhexlify(script)
+    blanked = 0
+    if hashcode == SIGHASH_NONE:
+        outs = []
     elif hashcode == SIGHASH_SINGLE:
-        newtx["outs"] = newtx["outs"][:len(newtx["ins"])]
-        for out in newtx["outs"][:len(newtx["ins"]) - 1]:
-            out['value'] = 2**64 - 1
-            out['script'] = ""
+        outs = outs[:len(ins)]
+        blanked = len(ins) - 1
     elif hashcode == SIGHASH_ANYONECANPAY:
-        newtx["ins"] = [newtx["ins"][i]]
-    else:
-        pass
-    return serialize(newtx, include_witness=False)
+        ins, i = [ins[i]], 0
+    o = [encode_4_bytes(txobj["version"]), num_to_var_int(len(ins))]
+    for j, inp in enumerate(ins):
+        o.append(unhex(inp["outpoint"]["hash"])[::-1])
+        o.append(encode_4_bytes(inp["outpoint"]["index"]))
+        o.append(num_to_var_int(len(script)) + script if j == i else b'\x00')
+        o.append(encode_4_bytes(inp["sequence"]))
+    o.append(num_to_var_int(len(outs)))
+    for j, out in enumerate(outs):
+        if j < blanked:
+            o.append(b'\xff' * 8 + b'\x00')
+        else:
+            out_script = unhex(out["script"])
+            o.append(encode_8_bytes(out["value"]) + num_to_var_int(len(out_script)) + out_script)
+    o.append(encode_4_bytes(txobj["locktime"]))
+    return safe_hexlify(b''.join(o)) if hexed else b''.join(o)
 
 # Making the actual signatures
 
@@ -455,28 +632,43 @@ def mk_multisig_script(*args):  # [pubs],k or pub1,pub2...pub[n],M
 # Signing and verifying
 
 
-def verify_tx_input(tx, i, script, sig, pub):
-    if re.match('^[0-9a-fA-F]*$', tx):
+def verify_tx_input(tx, i, script, sig, pub, cache=None):
+    if isinstance(tx, str) and re.match('^[0-9a-fA-F]*$', tx):
         tx = binascii.unhexlify(tx)
     if re.match('^[0-9a-fA-F]*$', script):
         script = binascii.unhexlify(script)
     if not re.match('^[0-9a-fA-F]*$', sig):
         sig = safe_hexlify(sig)
     hashcode = decode(sig[-2:], 16)
-    modtx = signature_form(tx, int(i), script, hashcode)
+    modtx = signature_form(tx, int(i), script, hashcode, cache)
     return ecdsa_tx_verify(modtx, sig, pub, hashcode)
 
-def multisign(tx, i, script, pk, hashcode=SIGHASH_ALL):
+def multisign(tx, i, script, pk, hashcode=SIGHASH_ALL, cache=None):
     if isinstance(tx, dict):
         tx = serialize(tx)
-    if re.match('^[0-9a-fA-F]*$', tx):
+    if isinstance(tx, str) and re.match('^[0-9a-fA-F]*$', tx):
         tx = binascii.unhexlify(tx)
-    if re.match('^[0-9a-fA-F]*$', script):
+    if isinstance(script, str) and re.match('^[0-9a-fA-F]*$', script):
         script = binascii.unhexlify(script)
-    modtx = signature_form(tx, i, script, hashcode)
+    modtx = signature_form(tx, i, script, hashcode, cache)
     return ecdsa_tx_sign(modtx, pk, hashcode)
 
 
+def multisign_inputs(tx, script, pk, hashcode=SIGHASH_ALL, indices=None):
+    """
+    multisign for several inputs of tx (all of them by default), sharing
+    one SighashCache: the BIP143 / FORKID hashes are computed once for
+    the transaction instead of once per input. Returns the signatures in
+    the order of indices.
+    """
+    cache = SighashCache(tx)
+    if indices is None:
+        indices = range(len(cache.tx["ins"]))
+    if isinstance(tx, dict):
+        tx = serialize(tx)
+    return [multisign(tx, i, script, pk, hashcode, cache) for i in indices]
+
+
 def apply_multisignatures(txobj, i, script, *args):
     # tx,i,script,sigs OR tx,i,script,sig1,sig2...,sig[n]
     sigs = args[0] if isinstance(args[0], list) else list(args)
@@ -1,5 +1,9 @@
+import collections
+import random
+import threading
 import unittest
 import pycryptotools.ripemd as ripemd
+import pycryptotools.main as main
 from pycryptotools import *
 from pycryptotools.coins import *
 
@@ -44,6 +48,93 @@ class TestECCArithmetic(unittest.TestCase):
             self.assertEqual(G[0], multiply(divide(G, x), x)[0])
 
 
+class TestFixedBaseMultiply(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print('Starting fixed-base generator multiplication tests')
+
+    def test_all(self):
+        scalars = [0, 1, 2, 15, 16, N - 1, N, N + 1, 2**255, -5]
+        scalars += [random.randrange(2**256) for i in range(10)]
+        for k in scalars:
+            self.assertEqual(
+                fast_base_multiply(k),
+                from_jacobian(jacobian_multiply(to_jacobian(G), k))
+            )
+
+    def test_wnaf(self):
+        for i in range(20):
+            k = random.randrange(2**256)
+            digits = to_wnaf(k, WNAF_WINDOW)
+            self.assertEqual(sum([d * 2**j for j, d in enumerate(digits)]), k)
+            self.assertTrue(all(d % 2 for d in digits if d))
+
+    def test_arbitrary_base(self):
+        for i in range(5):
+            x, y = random.randrange(1, N), random.randrange(2**256)
+            self.assertEqual(
+                fast_multiply(fast_base_multiply(x), y),
+                fast_base_multiply(x * y % N)
+            )
+        Q = fast_base_multiply(7)
+        self.assertEqual(fast_multiply(Q, N), (0, 0))
+        self.assertEqual(fast_multiply(Q, 1), Q)
+        self.assertEqual(fast_multiply(Q, -1), (Q[0], P - Q[1]))
+
+    def test_glv(self):
+        self.assertTrue(glv_enabled())
+        self.assertEqual(fast_multiply(G, GLV_LAMBDA), ((GLV_BETA * Gx) % P, Gy))
+        for i in range(10):
+            k = random.randrange(N)
+            k1, k2 = glv_split(k)
+            self.assertEqual((k1 + k2 * GLV_LAMBDA) % N, k)
+            self.assertLess(max(abs(k1), abs(k2)), 2**129)
+            Q = to_jacobian(fast_base_multiply(random.randrange(1, N)))
+            pos, neg = main._odd_multiples(Q, WNAF_WINDOW)
+            self.assertEqual(
+                from_jacobian(jacobian_multiply(Q, k)),
+                from_jacobian(main._jacobian_interleave([(pos, neg, to_wnaf(k, WNAF_WINDOW))]))
+            )
+
+    def test_shamir(self):
+        for i in range(5):
+            n, m = random.randrange(2**256), random.randrange(2**256)
+            Q = fast_base_multiply(random.randrange(1, N))
+            self.assertEqual(
+                fast_shamir(G, n, Q, m),
+                fast_add(fast_multiply(G, n), fast_multiply(Q, m))
+            )
+        Q = fast_base_multiply(5)
+        self.assertEqual(fast_shamir(G, 0, Q, 0), (0, 0))
+        self.assertEqual(fast_shamir(G, 5, Q, N - 1), (0, 0))
+        self.assertEqual(fast_shamir(G, 0, Q, 3), fast_base_multiply(15))
+
+    def test_verify_rejects(self):
+        priv = random.randrange(1, N)
+        pub = privtopub(priv)
+        v, r, s = ecdsa_raw_sign('35' * 32, priv)
+        self.assertTrue(ecdsa_raw_verify('35' * 32, (v, r, s), pub))
+        self.assertFalse(ecdsa_raw_verify('36' * 32, (v, r, s), pub))
+        self.assertFalse(ecdsa_raw_verify('35' * 32, (v, r, N - s), privtopub(priv + 1)))
+        self.assertFalse(ecdsa_raw_verify('35' * 32, (v, 0, s), pub))
+        self.assertFalse(ecdsa_raw_verify('35' * 32, (v, r, 0), pub))
+
+    def test_privkeys_to_pubkeys(self):
+        privs = [random.randrange(1, N) for i in range(7)]
+        privs = [privs[0], encode_privkey(privs[1], 'hex'), encode_privkey(privs[2], 'bin_compressed'),
+                 encode_privkey(privs[3], 'wif'), encode_privkey(privs[4], 'wif_compressed')] + privs[5:]
+        self.assertEqual(list(privkeys_to_pubkeys(privs, chunk_size=3)), [privtopub(p) for p in privs])
+        self.assertEqual(list(privkeys_to_pubkeys(iter(privs), 'hex_compressed')),
+                         [encode_pubkey(privtopub(p), 'hex_compressed') for p in privs])
+        self.assertEqual(list(privkeys_to_pubkeys([])), [])
+        self.assertRaises(Exception, list, privkeys_to_pubkeys([1, N]))
+
+    def test_batch_from_jacobian(self):
+        points = [jacobian_multiply(to_jacobian(G), k) for k in (3, 0, 7)]
+        self.assertEqual(batch_from_jacobian(points), [from_jacobian(p) for p in points])
+
+
 class TestBases(unittest.TestCase):
 
     @classmethod
@@ -71,6 +162,56 @@ class TestBases(unittest.TestCase):
             self.assertEqual(changebase(encode(x, frm), frm, to), encode(x, to))
             self.assertEqual(decode(changebase(encode(x, frm), frm, to), to), x)
 
+    def test_padding_and_edge_cases(self):
+        self.assertEqual(encode(255, 256, 4), b'\x00\x00\x00\xff')
+        self.assertEqual(encode(255, 16, 4), '00ff')
+        self.assertEqual(encode(57, 58, 3), '11z')
+        self.assertEqual(encode(5, 2, 6), '000101')
+        self.assertEqual(encode(0, 256), b'')
+        self.assertEqual(encode(-1, 16, 2), '00')
+        self.assertEqual(encode(2**64, 16, 4), '10000000000000000')
+        self.assertEqual(decode('ABCdef', 16), 0xabcdef)
+        self.assertEqual(decode(b'fff', 16), 0xfff)
+        self.assertEqual(decode('', 58), 0)
+        self.assertEqual(decode(b'\x00\x01\x00', 256), 256)
+        # characters outside the alphabet keep counting as digit -1
+        self.assertEqual(decode('1g', 16), 15)
+        for base in (2, 10, 16, 58, 256):
+            x = random.randrange(2**600)
+            self.assertEqual(decode(encode(x, base, 200), base), x)
+
+
+class TestBase58(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print('Starting Base58Check tests')
+
+    def test_vectors(self):
+        self.assertEqual(b58encode(b'\x00\x00hello world'), '11StV1DL6CwTryKyV')
+        self.assertEqual(b58decode('11StV1DL6CwTryKyV'), b'\x00\x00hello world')
+        self.assertEqual(b58encode(b''), '')
+        self.assertEqual(bin_to_b58check(binascii.unhexlify('751e76e8199196d454941c45d1b3a323f1433bd6')),
+                         '1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH')
+        self.assertEqual(get_version_byte('1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH'), 0)
+        self.assertEqual(get_version_byte(bin_to_b58check(b'\x01' * 20, 111)), 111)
+
+    def test_round_trip(self):
+        payloads = [b'\x00' * i + os.urandom(21) for i in range(4)]
+        self.assertEqual(decode_many(encode_many(payloads)), payloads)
+        self.assertEqual(decode_many(encode_many(payloads, check=False), check=False), payloads)
+        self.assertEqual(b58check_to_bin(bin_to_b58check(payloads[0][1:], 5)), payloads[0][1:])
+
+    def test_validation(self):
+        addr = '1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH'
+        self.assertIsNone(b58check_error(addr, length=21, version=0))
+        self.assertTrue(is_b58check(addr))
+        self.assertFalse(is_b58check(addr[:-1] + 'J'))
+        self.assertEqual(b58check_error(addr, version=5), 'Invalid version bytes 00')
+        self.assertEqual(b58check_error(addr, length=33), 'Invalid length 21, expected 33')
+        self.assertIn('character', b58check_error('0' + addr[1:]))
+        self.assertRaises(Base58Error, b58check_to_bin, addr[:-1] + 'J')
+
 
 class TestElectrumWalletInternalConsistency(unittest.TestCase):
 
@@ -164,6 +305,589 @@ class TestRawSignRecover(unittest.TestCase):
             )
 
 
+class TestBatchVerify(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Batch signature verification tests")
+
+    def setUp(self):
+        self.items = []
+        for i in range(6):
+            priv = sha256(str(i))
+            msghash = sha256('msg%d' % i)
+            self.items.append((msghash, ecdsa_raw_sign(msghash, priv), privtopub(priv)))
+
+    def test_batch_inv(self):
+        values = [random.randrange(N) for i in range(5)] + [0]
+        self.assertEqual(batch_inv(values, N), [inv(a, N) for a in values])
+
+    def test_per_item(self):
+        items = list(self.items)
+        msghash, (v, r, s), pub = items[2]
+        items[2] = (msghash, (v, r, (s + 1) % N), pub)
+        items[4] = (items[4][0], items[4][1], items[3][2])
+        self.assertEqual(ecdsa_batch_verify(items), [True, True, False, True, False, True])
+        self.assertEqual(ecdsa_batch_verify([]), [])
+
+    def test_all_valid(self):
+        self.assertTrue(ecdsa_batch_verify(self.items, all_valid=True))
+        # without recovery bytes the randomized check is skipped
+        der_items = [(h, (None, r, s), pub) for h, (v, r, s), pub in self.items]
+        self.assertTrue(ecdsa_batch_verify(der_items, all_valid=True))
+        bad = self.items[:3] + [(sha256('other'), self.items[3][1], self.items[3][2])]
+        self.assertFalse(ecdsa_batch_verify(bad, all_valid=True))
+
+
+class TestSignedMessageBatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Batch signed message verification tests")
+
+    def setUp(self):
+        self.items = []
+        for i in range(4):
+            priv = sha256(str(i))
+            msg = 'message %d' % (i % 2)
+            v, r, s = ecdsa_raw_sign(electrum_sig_hash(msg), priv)
+            pub = compress(privtopub(priv)) if i % 2 else privtopub(priv)
+            self.items.append((msg, encode_sig(v + 4 * (i % 2), r, s), pubtolegacy(pub)))
+
+    def test_recover_many(self):
+        pairs = [(msg, sig) for msg, sig, addr in self.items] + [('message 0', 'garbage')]
+        self.assertEqual(ecdsa_recover_many(pairs),
+                         [ecdsa_recover(msg, sig) for msg, sig in pairs[:-1]] + [False])
+
+    def test_verify_addr_many(self):
+        items = list(self.items)
+        items[1] = ('other message',) + items[1][1:]
+        items[2] = items[2][:2] + (items[3][2],)
+        self.assertEqual(ecdsa_verify_addr_many(items), [True, False, False, True])
+        self.assertEqual(ecdsa_verify_addr_many([]), [])
+
+    def test_header_address_types(self):
+        priv = sha256('segwit')
+        v, r, s = ecdsa_raw_sign(electrum_sig_hash('hello'), priv)
+        pub = compress(privtopub(priv))
+        h = bin_hash160(binascii.unhexlify(pub))
+        p2sh = bin_to_b58check(bin_hash160(b'\x00\x14' + h), 5)
+        bech32 = segwit_addr.encode('bc', 0, h)
+        items = [('hello', encode_sig(v + 4, r, s), pubtolegacy(privtopub(priv))),
+                 ('hello', encode_sig(v + 8, r, s), p2sh),
+                 ('hello', encode_sig(v + 12, r, s), bech32),
+                 ('hello', encode_sig(v + 4, r, s), bech32)]
+        self.assertEqual(ecdsa_verify_addr_many(items), [False, True, True, False])
+
+    def test_network(self):
+        priv = sha256('segwit')
+        v, r, s = ecdsa_raw_sign(electrum_sig_hash('hello'), priv)
+        h = bin_hash160(binascii.unhexlify(compress(privtopub(priv))))
+        p2sh = bin_hash160(b'\x00\x14' + h)
+        mainnet = [('hello', encode_sig(v + 4, r, s), bin_to_b58check(h, 0)),
+                   ('hello', encode_sig(v + 8, r, s), bin_to_b58check(p2sh, 5)),
+                   ('hello', encode_sig(v + 12, r, s), segwit_addr.encode('bc', 0, h))]
+        testnet = [('hello', encode_sig(v + 4, r, s), bin_to_b58check(h, 111)),
+                   ('hello', encode_sig(v + 8, r, s), bin_to_b58check(p2sh, 196)),
+                   ('hello', encode_sig(v + 12, r, s), segwit_addr.encode('tb', 0, h))]
+        self.assertEqual(ecdsa_verify_addr_many(mainnet + testnet), [True] * 3 + [False] * 3)
+        self.assertEqual(ecdsa_verify_addr_many(mainnet + testnet, magicbyte=111, script_magicbyte=196, segwit_hrp='tb'),
+                         [False] * 3 + [True] * 3)
+
+
+class TestECBackends(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("EC backend conformance tests")
+
+    def setUp(self):
+        self.active = get_backend().name
+
+    def tearDown(self):
+        set_backend(self.active)
+
+    def test_available(self):
+        self.assertIn('python', available_backends())
+        self.assertRaises(ValueError, set_backend, 'nonexistent')
+
+    def test_incomplete_backend(self):
+        class SignOnly(ECBackend):
+            name = 'sign-only'
+
+            def sign(self, msghash, priv):
+                return python_backend.sign(msghash, priv)
+        self.assertRaises(TypeError, SignOnly)
+
+    def test_conformance(self):
+        priv = 'e9873d79c6d87dc0fb6a5778633389f4453213303da61f20bd67fc233aa33262'
+        pub = '04588d202afcc1ee4ab5254c7847ec25b9a135bbda0f2bc69ee1a714749fd77dc9f88ff2a00d7e752d44cbe16e1ebcf0890b76ec7c78886109dee76ccfc8445424'
+        msghash = hashlib.sha256(b'backend conformance').digest()
+        vrs = (28, 30650533865879680521807742984362399330382293945655139092890467232988712225431,
+               56491964466502316536944431158607683027680354177161778274433749683621416253811)
+        spend_pub = '03616562c98e7d7b74be409a787cec3a912122f3fb331a9bee9b0b73ce7b9f50af'
+        scan_pub = '025e58a31122b38c86abc119b9379fe247410aee87a533f9c07b189aef6c3c1f52'
+        ephem_priv = '9e63abaf8dcd5ea3919e6de0b6c544e00bf51bf92496113a01d6e369944dc091'
+        shared_secret = 'a4047ee231f4121e3a99a3a3378542e34a384b865a9917789920e1f13ffd91c6'
+        pay_pub = '02726112ad39cb6bf848b1b1ef30b88e35286bf99f746c2be575f96c0e02a9357c'
+
+        for name in available_backends():
+            backend = get_backend(name)
+            v, r, s = vrs
+            self.assertEqual(backend.privkey_to_point(decode_privkey(priv)), decode_pubkey(pub), name)
+            self.assertEqual(backend.sign(msghash, decode_privkey(priv)), vrs, name)
+            self.assertTrue(backend.verify(msghash, r, s, decode_pubkey(pub)), name)
+            self.assertTrue(backend.verify(msghash, r, N - s, decode_pubkey(pub)), name)
+            self.assertFalse(backend.verify(msghash, r, s - 1, decode_pubkey(pub)), name)
+            self.assertEqual(backend.recover(msghash, v - 27, r, s), decode_pubkey(pub), name)
+            self.assertEqual(backend.tweak_add(decode_pubkey(spend_pub), decode_privkey(shared_secret)),
+                             decode_pubkey(pay_pub), name)
+            shared = backend.multiply(decode_pubkey(scan_pub), decode_privkey(ephem_priv))
+            self.assertEqual(sha256(encode_pubkey(shared, 'bin_compressed')), shared_secret, name)
+
+            set_backend(name)
+            self.assertEqual(privtopub(priv), pub, name)
+            self.assertEqual(ecdsa_raw_sign(msghash, priv), vrs, name)
+            self.assertEqual(ecdsa_raw_recover(msghash, vrs), decode_pubkey(pub), name)
+            self.assertEqual(pubkey_tweak_add(spend_pub, shared_secret), pay_pub, name)
+            self.assertEqual(pubkey_tweak_add(spend_pub, 0), spend_pub, name)
+
+
+class TestKeyObjects(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Key object tests")
+
+    def setUp(self):
+        self.priv = sha256('key objects')
+        self.pub = privtopub(self.priv + '01')
+
+    def test_public_key(self):
+        key = PublicKey.from_pubkey(self.pub)
+        self.assertTrue(key.compressed)
+        self.assertEqual(key, decode_pubkey(self.pub))
+        self.assertIs(key.hex(), self.pub)
+        self.assertEqual(key.serialize(), encode_pubkey(self.pub, 'bin_compressed'))
+        self.assertEqual(encode_pubkey(key, 'hex'), decompress(self.pub))
+        self.assertIs(key.hash160(), key.hash160())
+        self.assertEqual(pubkey_to_hash(key), pubkey_to_hash(self.pub))
+        self.assertEqual(decompress(key).hex(), decompress(self.pub))
+        self.assertIs(compress(key), key)
+
+    def test_functional_api(self):
+        key = PublicKey.from_pubkey(self.pub)
+        for result, expected in [(add_pubkeys(key, self.pub), add_pubkeys(self.pub, self.pub)),
+                                 (multiply(key, 5), multiply(self.pub, 5)),
+                                 (neg_pubkey(key), neg_pubkey(self.pub)),
+                                 (pubkey_tweak_add(key, self.priv), pubkey_tweak_add(self.pub, self.priv))]:
+            self.assertIsInstance(result, PublicKey)
+            self.assertEqual(result.hex(), expected)
+
+    def test_private_key(self):
+        key = PrivateKey.from_privkey(self.priv + '01')
+        self.assertTrue(key.compressed)
+        self.assertIs(privtopub(key), key.public_key)
+        self.assertEqual(key.public_key.hex(), self.pub)
+        self.assertEqual(key.encode('wif_compressed'), encode_privkey(self.priv, 'wif_compressed'))
+        self.assertEqual(ecdsa_raw_sign(sha256('msg'), key), ecdsa_raw_sign(sha256('msg'), self.priv + '01'))
+        self.assertEqual(add_privkeys(key, 1).secret, decode_privkey(add_privkeys(self.priv, 1)))
+        coin = Bitcoin()
+        self.assertEqual(coin.privtoaddr(key), coin.privtoaddr(self.priv + '01'))
+        self.assertEqual(coin.pubtolegacy(key.public_key), coin.pubtolegacy(self.pub))
+
+
+class TestJacobianPoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Jacobian point tests")
+
+    def test_mixed_add(self):
+        p = jacobian_multiply(to_jacobian(G), random.randrange(2, N))
+        q = to_jacobian(fast_base_multiply(random.randrange(2, N)))
+        self.assertEqual(from_jacobian(jacobian_add_affine(p, q)), fast_add(from_jacobian(p), q))
+        self.assertEqual(from_jacobian(jacobian_add_affine(p, to_jacobian(from_jacobian(p)))),
+                         from_jacobian(jacobian_double(p)))
+        self.assertFalse(jacobian_add_affine(p, to_jacobian(fast_multiply(from_jacobian(p), -1)))[1])
+
+    def test_chain(self):
+        a, b, c = [privtopub(sha256(str(i)) + '01') for i in range(3)]
+        point = JacobianPoint.from_pubkey(a) + b - c
+        point = 3 * point.tweak_add(sha256('tweak'))
+        expected = multiply(pubkey_tweak_add(subtract_pubkeys(add_pubkeys(a, b), c), sha256('tweak')), 3)
+        self.assertEqual(point.encode(), expected)
+        self.assertEqual(point, JacobianPoint.from_pubkey(expected))
+        self.assertNotEqual(point, JacobianPoint.from_pubkey(a))
+        self.assertTrue((JacobianPoint.from_pubkey(a) - a).is_infinity())
+        self.assertEqual((JacobianPoint.from_pubkey(a) - a).to_affine(), (0, 0))
+        self.assertEqual(subtract_pubkeys(a, a), encode_pubkey((0, 0), 'hex_compressed'))
+
+
+class TestMultiScalarMultiply(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Multi-scalar multiplication tests")
+
+    def reference(self, pairs):
+        total = (0, 0)
+        for pub, k in pairs:
+            total = fast_add(total, fast_multiply(decode_pubkey(pub), decode_privkey(k)))
+        return total
+
+    def test_strauss(self):
+        pairs = [(privtopub(random.randrange(1, N)), random.randrange(2**256)) for i in range(5)]
+        pairs += [(G, 12345), (pairs[0][0], N - pairs[0][1] % N), ((0, 0), 7), (pairs[1][0], 0)]
+        self.assertEqual(decode_pubkey(multi_scalar_multiply(pairs)), self.reference(pairs))
+
+    def test_pippenger(self):
+        pairs = [(fast_base_multiply(random.randrange(1, N)), random.randrange(N)) for i in range(20)]
+        pairs += [(G, 1), (pairs[0][0], N - pairs[0][1]), ((0, 0), 7), (pairs[1][0], 0)]
+        jpairs = [(to_jacobian(p), k) for p, k in pairs]
+        self.assertEqual(from_jacobian(main._jacobian_pippenger(jpairs)), self.reference(pairs))
+        pairs = [(privtopub(random.randrange(1, N)), encode(random.randrange(N), 16, 64))
+                 for i in range(PIPPENGER_THRESHOLD)]
+        self.assertEqual(decode_pubkey(multi_scalar_multiply(pairs)), self.reference(pairs))
+
+    def test_signed_digits(self):
+        for c in (2, 5, 8):
+            k = random.randrange(N)
+            digits = main._signed_digits(k, c)
+            self.assertEqual(sum([d * 2**(c*i) for i, d in enumerate(digits)]), k)
+            self.assertTrue(all(-2**(c-1) < d <= 2**(c-1) for d in digits))
+
+    def test_sum_pubkeys(self):
+        privs = [random.randrange(1, N) for i in range(10)]
+        pubs = [privtopub(encode_privkey(k, 'hex_compressed')) for k in privs]
+        self.assertEqual(sum_pubkeys(pubs), privtopub(encode_privkey(sum(privs) % N, 'hex_compressed')))
+        self.assertEqual(sum_pubkeys([pubs[0], neg_pubkey(pubs[0])]), encode_pubkey((0, 0), 'hex_compressed'))
+        self.assertEqual(sum_pubkeys([]), (0, 0))
+
+
+class TestPrecompute(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Precomputed point tests")
+
+    def setUp(self):
+        self.active = get_backend().name
+
+    def tearDown(self):
+        set_backend(self.active)
+
+    def test_multiply(self):
+        pub = privtopub(sha256('precompute') + '01')
+        scalars = [0, 1, N - 1, N, sha256('k')] + [random.randrange(2**256) for i in range(5)]
+        for name in available_backends():
+            set_backend(name)
+            for window in (3, PRECOMPUTE_WINDOW):
+                handle = precompute(pub, window)
+                for k in scalars:
+                    self.assertEqual(handle.multiply(k), multiply(pub, k))
+                    self.assertEqual(multiply(handle, k), multiply(pub, k))
+        self.assertRaises(Exception, precompute, (1, 2))
+        self.assertRaises(Exception, precompute, (0, 0))
+
+    def test_stealth(self):
+        # a sender paying the same stealth address many times reuses its handles
+        set_backend('python')
+        scan_priv, spend_priv = sha256('scan'), sha256('spend')
+        scan_pub, spend_pub = privtopub(scan_priv), privtopub(spend_priv)
+        scan, spend = precompute(scan_pub), precompute(spend_pub)
+        tables = None
+        for i in range(4):
+            ephem_priv = sha256('ephem %d' % i)
+            ephem_pub = privtopub(ephem_priv)
+            shared = shared_secret_sender(scan, ephem_priv)
+            self.assertEqual(shared, shared_secret_sender(scan_pub, ephem_priv))
+            self.assertEqual(shared, shared_secret_receiver(ephem_pub, scan_priv))
+            pay_pub = uncover_pay_pubkey_sender(scan, spend, ephem_priv)
+            self.assertEqual(pay_pub, uncover_pay_pubkey_sender(scan_pub, spend_pub, ephem_priv))
+            self.assertEqual(pay_pub, uncover_pay_pubkey_receiver(scan_priv, spend_pub, ephem_pub))
+            if tables is None:
+                tables = scan._table
+                self.assertIsNotNone(tables)
+            self.assertIs(scan._table, tables)
+
+
+class TestCurveContext(unittest.TestCase):
+
+    # NIST P-256, p = 3 mod 4 like secp256k1
+    p256 = Curve(0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff,
+                 0xffffffff00000000ffffffffffffffffbce6faada7179e84f3b9cac2fc632551,
+                 0xffffffff00000001000000000000000000000000fffffffffffffffffffffffc,
+                 0x5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e27d2604b,
+                 0x6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945d898c296,
+                 0x4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ececbb6406837bf51f5, 'p256')
+    p256_2g = 0x7cf27b188d034f7e8a52380304b51ac3c08969e277f21b35a60b48fc47669978
+
+    @classmethod
+    def setUpClass(cls):
+        print("Curve context tests")
+
+    def test_immutable(self):
+        self.assertRaises(AttributeError, setattr, SECP256K1, 'p', 7)
+        self.assertEqual(current_curve(), SECP256K1)
+        self.assertEqual(SECP256K1.params, (P, N, A, B, G))
+        self.assertTrue(SECP256K1.glv)
+        self.assertFalse(self.p256.glv)
+
+    def test_use_curve(self):
+        with use_curve(self.p256):
+            self.assertIs(current_curve(), self.p256)
+            self.assertEqual(getG(), self.p256.g)
+            self.assertEqual(fast_base_multiply(2)[0], self.p256_2g)
+            self.assertEqual(fast_multiply(self.p256.g, 2)[0], self.p256_2g)
+            pub = privtopub(sha256('p256') + '01')
+            self.assertEqual(decode_pubkey(pub), fast_multiply(self.p256.g, decode_privkey(sha256('p256'))))
+            sig = ecdsa_raw_sign(sha256('msg'), sha256('p256'))
+            self.assertTrue(ecdsa_raw_verify(sha256('msg'), sig, pub))
+        self.assertIs(current_curve(), SECP256K1)
+        self.assertEqual(fast_base_multiply(2), fast_add(G, G))
+        self.assertNotEqual(decode_pubkey(pub), decode_pubkey(privtopub(sha256('p256') + '01')))
+        self.assertEqual(self.p256.run(fast_base_multiply, 2)[0], self.p256_2g)
+        handle = self.p256.run(precompute, self.p256.g)
+        self.assertEqual(handle.multiply(2)[0], self.p256_2g)
+
+    def test_threads(self):
+        import threading
+        results = {}
+
+        def worker(curve, name):
+            with use_curve(curve):
+                results[name] = [fast_base_multiply(k) for k in range(1, 20)]
+
+        threads = [threading.Thread(target=worker, args=(c, c.name)) for c in (self.p256, SECP256K1)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results['p256'][1][0], self.p256_2g)
+        self.assertEqual(results['secp256k1'], [fast_base_multiply(k) for k in range(1, 20)])
+
+    def test_change_curve(self):
+        try:
+            change_curve(*self.p256.params[:4] + self.p256.g)
+            self.assertEqual(current_curve(), self.p256)
+            self.assertEqual(fast_base_multiply(2)[0], self.p256_2g)
+        finally:
+            change_curve(*SECP256K1.params[:4] + SECP256K1.g)
+        self.assertIs(current_curve(), SECP256K1)
+        self.assertEqual(main.N, SECP256K1.n)
+
+
+class TestGeneratorTableFile(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Generator table file tests")
+
+    def setUp(self):
+        import tempfile
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'g.tbl')
+        # a copy of secp256k1 with its own (empty) caches
+        self.curve = Curve(*SECP256K1.params[:4] + SECP256K1.g)
+
+    def tearDown(self):
+        import shutil
+        os.environ.pop(G_TABLE_ENV, None)
+        shutil.rmtree(self.dir)
+
+    def test_roundtrip(self):
+        with use_curve(self.curve):
+            save_generator_table(self.path, 5)
+            table = load_table(self.path, self.curve.params)
+            self.assertEqual(table.window, 5)
+            self.assertEqual(table[3][7], main._build_fixed_base_table(G, 5)[3][7])
+            self.assertIsNone(load_table(self.path, self.curve.params, window=4))
+            self.assertIsNone(load_table(self.path, (P, N, A, 5, G)))
+            self.assertIsNone(load_table(os.path.join(self.dir, 'missing'), self.curve.params))
+
+            os.environ[G_TABLE_ENV] = self.path
+            self.assertIsInstance(main._generator_table()[1], MappedTable)
+            for k in (1, 2**255 + 12345, N - 1, random.randrange(N)):
+                self.assertEqual(fast_base_multiply(k), fast_multiply(G, k))
+
+    def test_corrupted(self):
+        with use_curve(self.curve):
+            save_generator_table(self.path, 4)
+            with open(self.path, 'r+b') as f:
+                f.seek(1000)
+                byte = f.read(1)
+                f.seek(1000)
+                f.write(bytes([byte[0] ^ 1]))
+            self.assertIsNone(load_table(self.path, self.curve.params))
+            os.environ[G_TABLE_ENV] = self.path
+            self.assertIsInstance(main._generator_table()[1], list)
+            self.assertEqual(privtopub(sha256('x')), SECP256K1.run(privtopub, sha256('x')))
+
+    def test_wrong_generator(self):
+        with use_curve(self.curve):
+            # valid file and curve digest, but the points are multiples of 2G
+            write_table(self.path, main._build_fixed_base_table(fast_multiply(G, 2), 4), 4, self.curve.params)
+            self.assertIsNone(load_table(self.path, self.curve.params))
+            os.environ[G_TABLE_ENV] = self.path
+            self.assertIsInstance(main._generator_table()[1], list)
+            self.assertEqual(privtopub(sha256('x')), SECP256K1.run(privtopub, sha256('x')))
+
+
+class TestDecompressionCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Decompression cache tests")
+
+    def tearDown(self):
+        set_decompression_cache_size(DECOMPRESSION_CACHE_SIZE)
+        decompression_cache.clear()
+
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.info(), {'hits': 1, 'misses': 1, 'size': 2, 'maxsize': 2})
+        cache.resize(1)
+        self.assertEqual(list(cache._data), ['c'])
+
+    def test_decode(self):
+        decompression_cache.clear()
+        pubs = [privtopub(sha256(str(i)) + '01') for i in range(3)]
+        expected = [decode_pubkey(decompress(p)) for p in pubs]
+        for i in range(2):
+            self.assertEqual([decode_pubkey(p) for p in pubs], expected)
+        self.assertEqual(decompression_cache_info()['hits'], 6)
+        self.assertEqual(decompression_cache_info()['misses'], 3)
+        self.assertEqual(multiply(pubs[0], 2), add_pubkeys(pubs[0], pubs[0]))
+        self.assertEqual(decompression_cache_info()['hits'], 9)
+        self.assertEqual(decompression_cache_info()['misses'], 3)
+
+        set_decompression_cache_size(1)
+        self.assertEqual(len(decompression_cache), 1)
+        set_decompression_cache_size(0)
+        self.assertEqual(len(decompression_cache), 0)
+        self.assertEqual([decode_pubkey(p) for p in pubs], expected)
+        self.assertEqual(len(decompression_cache), 0)
+
+    def test_shared_between_threads(self):
+        set_decompression_cache_size(4)
+        pubs = [privtopub(sha256(str(i)) + '01') for i in range(6)]
+        expected = dict((p, decode_pubkey(decompress(p))) for p in pubs)
+        errors = []
+
+        def work(seed):
+            rand = random.Random(seed)
+            try:
+                for i in range(200):
+                    pub = rand.choice(pubs)
+                    if decode_pubkey(pub) != expected[pub]:
+                        errors.append('wrong point')
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_eviction_during_get(self):
+        # another thread evicts the key between the lookup and the LRU update
+        cache = LRUCache(1)
+        cache.put('a', 1)
+        evictions = []
+
+        class Racing(collections.OrderedDict):
+            def __getitem__(self, key):
+                value = collections.OrderedDict.__getitem__(self, key)
+                evict = threading.Thread(target=cache.put, args=('b', 2))
+                evict.start()
+                evict.join(0.2)
+                evictions.append(evict)
+                return value
+        cache._data = Racing(cache._data)
+        self.assertEqual(cache.get('a'), 1)
+        for t in evictions:
+            t.join()
+        self.assertEqual(list(cache._data), ['b'])
+
+
+class TestSigningKey(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Signing key tests")
+
+    def test_deterministic_k(self):
+        # RFC6979 A.2.5 does not cover secp256k1, this is the widely used
+        # vector for key 1 and sha256('Satoshi Nakamoto')
+        msghash = hashlib.sha256(b'Satoshi Nakamoto').digest()
+        self.assertEqual(deterministic_generate_k(msghash, 1),
+                         0x8f8a276c19f4149656b280621e358cce24f5f52542772691ee69063b74f15d15)
+
+    def test_sign_many(self):
+        hashes = [sha256(str(i)) for i in range(10)] + [bin_sha256('bytes')]
+        for priv in (sha256('signing key'), encode_privkey(sha256('signing key'), 'wif_compressed')):
+            for verify in SigningKey.VERIFY_POLICIES:
+                key = SigningKey(priv, verify=verify, sample_rate=0.5)
+                self.assertEqual(key.sign_many(hashes), [ecdsa_raw_sign(h, priv) for h in hashes])
+            self.assertEqual(key.pubkey, privtopub(priv))
+        self.assertRaises(ValueError, SigningKey, priv, verify='sometimes')
+        self.assertRaises(Exception, SigningKey, N)
+
+    def test_bad_signature(self):
+        key = SigningKey(sha256('signing key'))
+        key._point = decode_pubkey(privtopub(sha256('other key')))
+        self.assertRaises(Exception, key.sign, sha256('msg'))
+        key.verify = 'never'
+        self.assertEqual(key.sign(sha256('msg')), ecdsa_raw_sign(sha256('msg'), sha256('signing key')))
+
+
+class TestAddressCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print('Address cache tests')
+
+    def setUp(self):
+        self.pubs = [privtopub(sha256(str(i))) for i in range(5)]
+        self.coin = Bitcoin()
+        self.expected = [(self.coin.pubtoaddr(p), self.coin.pubtolegacy(p)) for p in self.pubs]
+
+    def test_cached_results(self):
+        self.assertIsNone(self.coin.address_cache_info())
+        self.coin.enable_address_cache(maxsize=100)
+        for i in range(2):
+            self.assertEqual([(self.coin.pubtoaddr(p), self.coin.pubtolegacy(p)) for p in self.pubs], self.expected)
+        info = self.coin.address_cache_info()
+        self.assertEqual((info['hits'], info['misses'], info['size']), (10, 10, 10))
+        # hex, binary, tuple and Point inputs do not share entries, only
+        # binary and Point ones get compressed
+        pub = decode_pubkey(self.pubs[0])
+        compressed = pubtolegacy(compress(self.pubs[0]))
+        self.assertEqual(self.coin.pubtolegacy(pub), self.expected[0][1])
+        self.assertEqual(self.coin.pubtolegacy(Point(*pub)), compressed)
+        self.assertEqual(self.coin.pubtolegacy(Point(*pub), use_compressed_addr=False), self.expected[0][1])
+        self.assertEqual(self.coin.pubtolegacy(binascii.unhexlify(self.pubs[0])), compressed)
+
+    def test_invalidation(self):
+        self.coin.enable_address_cache(maxsize=2)
+        for p in self.pubs:
+            self.coin.pubtolegacy(p)
+        self.assertEqual(len(self.coin.address_cache), 2)
+        self.coin.magicbyte = 111
+        self.assertEqual(len(self.coin.address_cache), 0)
+        self.assertEqual(self.coin.pubtolegacy(self.pubs[0]), Bitcoin(testnet=True).pubtolegacy(self.pubs[0]))
+        self.coin.disable_address_cache()
+        self.assertIsNone(self.coin.address_cache)
+
+
 class TestTransactionSignVerify(unittest.TestCase):
 
     @classmethod
@@ -224,6 +948,134 @@ class TestSerialize(unittest.TestCase):
         )
 
 
+class TestSighashCache(unittest.TestCase):
+
+    # BIP143 native P2WPKH example
+    unsigned = ('0100000002fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f0000000000eeffffffef51e1b804cc89'
+                'd182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378'
+                'db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac11000000')
+    script_code = '76a9141d0f172a0ecb48aee1be1f2687d2963ae33f71a188ac'
+
+    @classmethod
+    def setUpClass(cls):
+        print("BIP143 sighash cache tests")
+
+    def setUp(self):
+        self.tx = deserialize(self.unsigned)
+        for inp, amount in zip(self.tx['ins'], (625000000, 600000000)):
+            inp['amount'] = amount
+            inp['segwit'] = True
+
+    def test_bip143_vector(self):
+        cache = SighashCache(self.tx)
+        preimage = signature_form(self.tx, 1, self.script_code, cache=cache)
+        self.assertEqual(txhash(preimage, SIGHASH_ALL), 'c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670')
+        self.assertEqual(preimage, signature_form(self.tx, 1, self.script_code))
+        self.tx['ins'][1]['script'] = self.script_code
+        self.assertEqual(preimage, uahf_digest(self.tx, 1))
+
+    def test_sign_and_verify_with_cache(self):
+        priv = sha256('sighash cache')
+        pub = compress(privtopub(priv))
+        cache = SighashCache(self.tx)
+        for i in range(2):
+            sig = multisign(self.tx, i, self.script_code, priv, cache=cache)
+            self.assertTrue(verify_tx_input(self.unsigned, i, self.script_code, sig, pub, cache=cache))
+            self.assertFalse(verify_tx_input(self.unsigned, 1 - i, self.script_code, sig, pub, cache=cache))
+        # FORKID signatures of a legacy transaction go through the same digest
+        del self.tx['ins'][0]['segwit']
+        hashcode = SIGHASH_ALL | SIGHASH_FORKID
+        sig = multisign(self.tx, 0, self.script_code, priv, hashcode, cache=SighashCache(self.tx))
+        self.assertTrue(verify_tx_input(self.unsigned, 0, self.script_code, sig, pub, cache=cache))
+
+    def test_multisign_inputs(self):
+        priv = sha256('sighash cache')
+        pub = compress(privtopub(priv))
+        cache = SighashCache(self.tx)
+        sigs = multisign_inputs(self.tx, self.script_code, priv)
+        self.assertEqual(sigs, [multisign(self.tx, i, self.script_code, priv, cache=cache) for i in range(2)])
+        for i, sig in enumerate(sigs):
+            self.assertTrue(verify_tx_input(self.unsigned, i, self.script_code, sig, pub, cache=cache))
+        self.assertEqual(multisign_inputs(self.tx, self.script_code, priv, indices=[1]), sigs[1:])
+        # legacy inputs go through the same call
+        sigs = multisign_inputs(self.unsigned, self.script_code, priv)
+        self.assertEqual(sigs, [multisign(self.unsigned, i, self.script_code, priv) for i in range(2)])
+
+
+class TestLegacySignatureForm(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Legacy signature form tests")
+
+    def setUp(self):
+        self.tx = {'version': 1, 'locktime': 0, 'ins': [], 'outs': []}
+        for i in range(3):
+            self.tx['ins'].append({'outpoint': {'hash': '%064x' % (i + 1), 'index': i}, 'script': '51' * (i + 1),
+                                   'sequence': 0xffffffff})
+            self.tx['outs'].append({'value': 1000 * (i + 1), 'script': '6a0%d' % i})
+
+    def test_hashcodes(self):
+        script = '76a914' + '00' * 20 + '88ac'
+        for hashcode in (SIGHASH_ALL, SIGHASH_NONE, SIGHASH_SINGLE, SIGHASH_ANYONECANPAY):
+            newtx = deserialize(serialize(self.tx))
+            for inp in newtx['ins']:
+                inp['script'] = ''
+            newtx['ins'][1]['script'] = script
+            if hashcode == SIGHASH_NONE:
+                newtx['outs'] = []
+            elif hashcode == SIGHASH_SINGLE:
+                for out in newtx['outs'][:2]:
+                    out['value'], out['script'] = 2**64 - 1, ''
+            elif hashcode == SIGHASH_ANYONECANPAY:
+                newtx['ins'] = newtx['ins'][1:2]
+            expected = serialize(newtx, include_witness=False)
+            self.assertEqual(signature_form(self.tx, 1, script, hashcode), expected)
+            self.assertEqual(signature_form(serialize(self.tx), 1, script, hashcode), expected)
+            self.assertEqual(signature_form(binascii.unhexlify(serialize(self.tx)), 1, binascii.unhexlify(script), hashcode),
+                             binascii.unhexlify(expected))
+        # the transaction itself is left untouched
+        self.assertEqual(self.tx['ins'][0]['script'], '51')
+
+
+class TestParsedTx(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print("Lazy transaction parser tests")
+
+    def setUp(self):
+        self.legacy = TestSighashCache.unsigned
+        tx = deserialize(self.legacy)
+        tx['marker'], tx['flag'] = 0, 1
+        tx['witness'] = [{'number': 2, 'scriptCode': '02aaaa00'}, {'number': 0, 'scriptCode': ''}]
+        self.segwit = serialize(tx)
+
+    def test_matches_deserialize(self):
+        for raw in (self.legacy, self.segwit):
+            tx = parse_tx(raw)
+            self.assertEqual(tx.to_dict(hexlify=True), deserialize(raw))
+            self.assertEqual(tx.to_dict(), deserialize(binascii.unhexlify(raw)))
+            self.assertEqual(tx.txid(), public_txhash(raw))
+            self.assertEqual(tx.tobytes(), binascii.unhexlify(raw))
+        tx = parse_tx(self.segwit)
+        self.assertEqual(tx.witness_items(0), [b'\xaa\xaa', b''])
+        self.assertEqual(tx.witness_items(1), [])
+        self.assertEqual(tx.outpoint(1), (binascii.unhexlify('8ac60eb9575db5b2d987e29f301b5b819ea83a5c6579d282d189cc04b8e151ef'), 1))
+        self.assertEqual(tx.output_value(0), 112340000)
+        self.assertEqual(tx.sequence(0), 0xffffffee)
+        self.assertEqual(tx.output_script(1), binascii.unhexlify('76a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac'))
+
+    def test_parse_many(self):
+        stream = binascii.unhexlify(self.legacy + self.segwit + self.legacy)
+        txs = list(parse_many(stream))
+        self.assertEqual([tx.segwit for tx in txs], [False, True, False])
+        self.assertEqual(txs[2].end, len(stream))
+        self.assertEqual([tx.txid() for tx in parse_many([self.legacy, self.segwit])], [tx.txid() for tx in txs[:2]])
+        self.assertRaises(ValueError, parse_tx, binascii.unhexlify(self.segwit)[:-1])
+        self.assertRaises(ValueError, list, parse_many(stream[:-1]))
+
+
 class TestTransaction(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -459,6 +1311,50 @@ class TestRipeMD160PythonBackup(unittest.TestCase):
             self.assertEqual(bytes_to_hex_string(hash160digest), hash160target[i])
             self.assertEqual(bytes_to_hex_string(bin_hash160(from_string_to_bytes(s))), hash160target[i])
             self.assertEqual(hash160(from_string_to_bytes(s)), hash160target[i])
+            self.assertEqual(bytes_to_hex_string(ripemd.ripemd160(s)), target[i])
+
+    def test_streaming(self):
+        data = bytes(range(256)) * 3
+        expected = ripemd.RIPEMD160(data).digest()
+        self.assertEqual(ripemd.ripemd160(data), expected)
+        h = ripemd.new()
+        for i in range(0, len(data), 37):
+            h.update(data[i:i+37])
+        self.assertEqual(h.digest(), expected)
+        self.assertEqual(ripemd.ripemd160(data[:100]), ripemd.RIPEMD160(memoryview(data)[:100]).digest())
+
+
+class TestHashBackends(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        print('Testing the hash backends')
+
+    def setUp(self):
+        self.previous = hash_backend()['ripemd160']
+
+    def tearDown(self):
+        set_hash_backend(self.previous)
+
+    def test_backends_agree(self):
+        self.assertIn('python', available_hash_backends())
+        self.assertEqual(set_hash_backend(), available_hash_backends()[0])
+        data = b'The quick brown fox jumps over the lazy dog'
+        for name in available_hash_backends():
+            set_hash_backend(name)
+            self.assertEqual(hash_backend(), {'sha256': 'hashlib', 'ripemd160': name})
+            self.assertEqual(safe_hexlify(bin_ripemd160(data)), '37f332f68db77bd9d7edd4969571ad671cf9dd3b')
+            self.assertEqual(hash160(data), '0e3397b4abc7a382b3ea2365883c3c7ca5f07600')
+        self.assertRaises(ValueError, set_hash_backend, 'md5')
+
+    def test_hash160_many(self):
+        pubkeys = [binascii.unhexlify(compress(privtopub(i))) for i in range(1, 40)] + [b'', b'\x00' * 65]
+        expected = b''.join(bin_hash160(pub) for pub in pubkeys)
+        for name in available_hash_backends():
+            set_hash_backend(name)
+            self.assertEqual(hash160_many(pubkeys), expected)
+            self.assertEqual(hash160_many(iter(pubkeys[:1])), expected[:20])
+            self.assertEqual(hash160_many([]), b'')
 
 
 class TestScriptVsAddressOutputs(unittest.TestCase):